@@ -0,0 +1,333 @@
+import asyncio
+import itertools
+import json
+import queue
+import threading
+import time
+
+from devices import Gateway
+
+ADAPTER_POLL_MS = 10
+POOL_SIZE = 2
+MAX_BATCH = 64
+TIMEOUT = 1.0
+RETRIES = 2
+BACKOFF = 0.05
+DRAIN_TIMEOUT = 1.0
+CLIENT_OPTIONS = ("batch", "timeout", "retries", "backoff")
+
+
+class AdapterError(Exception):
+    pass
+
+
+def parse_address(address):
+    if "/" in address:
+        return {"path": address}
+    host, _, port = address.rpartition(":")
+    return {"host": host or "127.0.0.1", "port": int(port)}
+
+
+class Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count(1)
+        self.waiting = {}
+        self.closed = False
+        self.task = asyncio.ensure_future(self.read_responses())
+
+    async def request(self, commands):
+        if self.closed:
+            raise ConnectionResetError("gateway connection closed")
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[request_id] = future
+        try:
+            self.writer.write(json.dumps({"id": request_id, "commands": commands}).encode() + b"\n")
+            await self.writer.drain()
+            return await future
+        finally:
+            self.waiting.pop(request_id, None)
+
+    async def read_responses(self):
+        error = ConnectionResetError("gateway closed the connection")
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self.waiting.get(response.get("id")) if isinstance(response, dict) else None
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except OSError as e:
+            error = e
+        except ValueError as e:
+            error = AdapterError(f"bad response from gateway: {e}")
+        finally:
+            self.closed = True
+            for future in self.waiting.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.writer.close()
+
+    def close(self):
+        self.task.cancel()
+
+
+class JsonLineAdapter:
+    def __init__(self, host="127.0.0.1", port=None, path=None, pool=POOL_SIZE):
+        if port is None and path is None:
+            raise ValueError("a jsonl gateway needs a 'port' or a 'path'")
+        self.host = host
+        self.port = port
+        self.path = path
+        self.pool_size = pool
+        self.connections = []
+        self.lock = None
+        self.connects = 0
+
+    async def connect(self):
+        if self.path is not None:
+            reader, writer = await asyncio.open_unix_connection(self.path)
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        self.connects += 1
+        return Connection(reader, writer)
+
+    def least_busy(self):
+        self.connections = [connection for connection in self.connections if not connection.closed]
+        return min(self.connections, key=lambda connection: len(connection.waiting), default=None)
+
+    async def connection(self):
+        connection = self.least_busy()
+        if connection is not None and (not connection.waiting or len(self.connections) >= self.pool_size):
+            return connection
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            connection = self.least_busy()
+            if connection is not None and (not connection.waiting or len(self.connections) >= self.pool_size):
+                return connection
+            connection = await self.connect()
+            self.connections.append(connection)
+            return connection
+
+    async def send(self, commands):
+        response = await (await self.connection()).request(commands)
+        if "error" in response:
+            raise AdapterError(response["error"])
+        results = response.get("results")
+        if not isinstance(results, list) or len(results) != len(commands):
+            raise AdapterError("gateway sent a malformed response")
+        return results
+
+    async def close(self):
+        for connection in self.connections:
+            connection.close()
+        await asyncio.gather(*(connection.task for connection in self.connections), return_exceptions=True)
+
+
+ADAPTERS = {
+    "jsonl": JsonLineAdapter,
+}
+
+
+class GatewayClient:
+    def __init__(self, adapter, report, batch=MAX_BATCH, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+        self.adapter = adapter
+        self.report = report
+        self.batch = batch
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pending = {}
+        self.in_flight = set()
+        self.flushing = False
+        self.tasks = set()
+        self.requests = 0
+        self.retried = 0
+
+    def enqueue(self, device_id, state, version):
+        self.pending[device_id] = (state, version)
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        if not self.flushing:
+            self.flushing = True
+            asyncio.get_running_loop().call_soon(self.flush)
+
+    def flush(self):
+        self.flushing = False
+        ready = [device_id for device_id in self.pending if device_id not in self.in_flight]
+        for start in range(0, len(ready), self.batch):
+            items = [(device_id, self.pending.pop(device_id)) for device_id in ready[start:start + self.batch]]
+            self.in_flight.update(device_id for device_id, _command in items)
+            task = asyncio.ensure_future(self.send_batch(items))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def send_batch(self, items):
+        commands = [{"device": device_id, "state": state} for device_id, (state, _version) in items]
+        try:
+            results = await self.send_with_retries(commands)
+            for (device_id, (_state, version)), result in zip(items, results):
+                if not isinstance(result, dict) or ("error" not in result and not isinstance(result.get("state"), bool)):
+                    self.report(device_id, version, None, "gateway sent a malformed result")
+                else:
+                    self.report(device_id, version, result.get("state"), result.get("error"))
+        except (asyncio.TimeoutError, OSError, AdapterError) as e:
+            error = "timed out" if isinstance(e, asyncio.TimeoutError) else str(e) or type(e).__name__
+            for device_id, (_state, version) in items:
+                self.report(device_id, version, None, error)
+        finally:
+            self.in_flight.difference_update(device_id for device_id, _command in items)
+            if self.pending:
+                self.schedule_flush()
+
+    async def send_with_retries(self, commands):
+        for attempt in itertools.count():
+            self.requests += 1
+            try:
+                return await asyncio.wait_for(self.adapter.send(commands), self.timeout)
+            except (asyncio.TimeoutError, OSError, AdapterError):
+                if attempt >= self.retries:
+                    raise
+            self.retried += 1
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def close(self, timeout=DRAIN_TIMEOUT):
+        if self.tasks:
+            await asyncio.wait(self.tasks, timeout=timeout)
+        for task in self.tasks:
+            task.cancel()
+        await self.adapter.close()
+
+
+def make_client(gateway, report):
+    adapter_class = ADAPTERS.get(gateway.adapter)
+    if adapter_class is None:
+        raise ValueError(f"gateway {gateway.id!r} uses unknown adapter {gateway.adapter!r}")
+    options = dict(gateway.options)
+    client_options = {key: options.pop(key) for key in CLIENT_OPTIONS if key in options}
+    try:
+        return GatewayClient(adapter_class(**options), report, **client_options)
+    except TypeError as e:
+        raise ValueError(f"gateway {gateway.id!r}: {e}") from None
+
+
+class DeviceLink:
+    def __init__(self, root, gateways, routes, on_results, poll_ms=ADAPTER_POLL_MS):
+        self.root = root
+        self.routes = routes
+        self.on_results = on_results
+        self.poll_ms = poll_ms
+        self.clients = {gateway.id: make_client(gateway, self.report) for gateway in gateways.values()}
+        self.results = queue.SimpleQueue()
+        self.versions = {}
+        self.waiting = {}
+        self.rollback = {}
+        self.sent_at = {}
+        self.outbox = []
+        self.latencies = None
+        self.loop = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.after_id = None
+        self.sent = 0
+        self.acknowledged = 0
+        self.failed = 0
+
+    @classmethod
+    def for_registry(cls, root, registry, on_results, address=None):
+        gateways = dict(registry.gateways)
+        routes = {device.id: device.gateway for device in registry if device.gateway is not None}
+        if address is not None:
+            gateways["default"] = Gateway("default", "jsonl", parse_address(address))
+            for device in registry:
+                routes.setdefault(device.id, "default")
+        return cls(root, gateways, routes, on_results)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="device-link", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(asyncio.gather(*(client.close() for client in self.clients.values())))
+            self.loop.close()
+
+    def stop(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+        if self.loop is not None and self.thread.is_alive():
+            if self.outbox:
+                self.flush()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+    def submit(self, changes):
+        now = time.perf_counter()
+        for device_id, state in changes:
+            gateway_id = self.routes.get(device_id)
+            if gateway_id is None:
+                continue
+            version = self.versions.get(device_id, 0) + 1
+            self.versions[device_id] = version
+            if device_id not in self.waiting:
+                self.rollback[device_id] = not state
+            self.waiting[device_id] = version
+            self.sent_at[device_id] = now
+            if not self.outbox:
+                self.root.after_idle(self.flush)
+            self.outbox.append((self.clients[gateway_id], device_id, state, version))
+        if self.after_id is None and self.waiting:
+            self.after_id = self.root.after(self.poll_ms, self.poll)
+
+    def flush(self):
+        batch = self.outbox
+        self.outbox = []
+        self.sent += len(batch)
+        self.loop.call_soon_threadsafe(self.enqueue, batch)
+
+    def enqueue(self, batch):
+        for client, device_id, state, version in batch:
+            client.enqueue(device_id, state, version)
+
+    def report(self, device_id, version, state, error):
+        self.results.put((device_id, version, state, error))
+
+    def poll(self):
+        self.after_id = None
+        now = time.perf_counter()
+        settled = []
+        while True:
+            try:
+                device_id, version, state, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if error is None:
+                self.acknowledged += 1
+            else:
+                self.failed += 1
+            if self.waiting.get(device_id) != version:
+                if error is None and device_id in self.waiting:
+                    self.rollback[device_id] = state
+                continue
+            del self.waiting[device_id]
+            rollback = self.rollback.pop(device_id)
+            if self.latencies is not None:
+                self.latencies.append(now - self.sent_at[device_id])
+            settled.append((device_id, rollback if error is not None else state, error))
+        if settled:
+            self.on_results(settled)
+        if self.waiting:
+            self.after_id = self.root.after(self.poll_ms, self.poll)
@@ -0,0 +1,189 @@
+import argparse
+import contextlib
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from devices import DeviceRegistry, house_config
+from headless import HeadlessBackend, HeadlessRoot, NullCanvas, RecordingCanvas
+from home_control import FRAME_MS, HomeApplianceControl
+
+SCENARIOS = {
+    "light": ["living_room_light"],
+    "fan": ["living_room_fan"],
+    "ac": ["air_conditioner"],
+    "tv": ["tv"],
+    "speaker": ["speaker"],
+    "radio": ["radio"],
+    "all nine on": None,
+}
+
+
+class TclCallCounter:
+    def __init__(self, widget):
+        self.widget = widget
+        self.interp = None
+        self.calls = 0
+
+    def __enter__(self):
+        self.interp = self.widget.tk
+        self.widget.tk = self
+        return self
+
+    def __exit__(self, *exc_info):
+        self.widget.tk = self.interp
+
+    def call(self, *args):
+        self.calls += 1
+        return self.interp.call(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.interp, name)
+
+
+def build_app(appliances, canvas, registry=None):
+    root = HeadlessRoot()
+    app = HomeApplianceControl(root, HeadlessBackend(canvas=canvas), registry=registry)
+    return root, app, switch_on(app, appliances)
+
+
+def switch_on(app, appliances):
+    if appliances is None:
+        appliances = list(app.appliance_states)
+    for appliance in appliances:
+        app.appliance_states[appliance] = True
+        app.start_animation(appliance)
+    return appliances
+
+
+def count_updates(app):
+    counter = {"updates": 0}
+    for subscriber in app.clock.subscribers.values():
+        callback = subscriber.callback
+
+        def counted(steps=1, callback=callback):
+            counter["updates"] += 1
+            callback(steps)
+
+        subscriber.callback = counted
+    return counter
+
+
+def measure_speed(appliances, seconds, seed, canvas, registry=None):
+    random.seed(seed)
+    root, app, appliances = build_app(appliances, canvas, registry)
+    canvases = [app.animation_canvases[a] for a in appliances if a in app.animation_canvases]
+    for c in canvases:
+        c.reset_counters()
+    counter = count_updates(app)
+    hits, misses = app.frame_cache.hits, app.frame_cache.misses
+
+    start = time.perf_counter()
+    root.advance(seconds * 1000)
+    wall = time.perf_counter() - start
+    hits, misses = app.frame_cache.hits - hits, app.frame_cache.misses - misses
+
+    updates = counter["updates"] or 1
+    return {
+        "updates": counter["updates"],
+        "fps": counter["updates"] / wall if wall else float("inf"),
+        "items_per_frame": sum(c.items_created for c in canvases) / updates,
+        "calls_per_frame": sum(c.total_calls() for c in canvases) / updates,
+        "live_items": sum(c.live_items for c in canvases),
+        "cache_hits": hits,
+        "cache_misses": misses,
+    }
+
+
+def measure_allocations(appliances, seconds, seed, canvas, registry=None):
+    random.seed(seed)
+    root, app, appliances = build_app(appliances, canvas, registry)
+    counter = count_updates(app)
+
+    tracemalloc.start()
+    transient = 0
+    try:
+        for _ in range(int(seconds * 1000 / FRAME_MS)):
+            current, _peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            root.advance(FRAME_MS)
+            transient += tracemalloc.get_traced_memory()[1] - current
+    finally:
+        tracemalloc.stop()
+    return transient / (counter["updates"] or 1)
+
+
+def measure_tcl_calls(appliances, seconds, seed, registry=None):
+    import tkinter as tk
+    random.seed(seed)
+    root = tk.Tk()
+    app = HomeApplianceControl(root, registry=registry, use_sprites=False)
+    appliances = switch_on(app, appliances)
+    root.update()
+    counter = count_updates(app)
+    counters = [TclCallCounter(app.animation_canvases[a]) for a in appliances if a in app.animation_canvases]
+
+    try:
+        with contextlib.ExitStack() as stack:
+            for tcl in counters:
+                stack.enter_context(tcl)
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                root.update()
+                time.sleep(0.001)
+    finally:
+        app.on_close()
+    updates = counter["updates"] or 1
+    return counter["updates"], sum(tcl.calls for tcl in counters) / updates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless animation micro-benchmarks")
+    parser.add_argument("--seconds", type=float, default=10.0, help="simulated seconds per scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--null", action="store_true", help="use NullCanvas instead of RecordingCanvas")
+    parser.add_argument("--house", type=int, metavar="N", help="also run a generated house with N devices all on")
+    parser.add_argument("--ac-particles", type=int, metavar="N", help="also run one AC with an N-particle pool")
+    parser.add_argument("--tk", action="store_true",
+                        help="count Tcl calls per frame on a real Tk window in real time (needs a display)")
+    parser.add_argument("scenarios", nargs="*", help=f"any of {', '.join(SCENARIOS)}")
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}")
+
+    canvas = NullCanvas if args.null else RecordingCanvas
+    names = args.scenarios or list(SCENARIOS)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        runs = [(name, SCENARIOS[name], None) for name in names]
+        if args.house:
+            registry = DeviceRegistry.from_config(house_config(args.house))
+            runs.append((f"house x{args.house}", None, registry))
+        if args.ac_particles:
+            registry = DeviceRegistry()
+            registry.add_section("climate", "Climate Control")
+            registry.add_device("ac", "AC", "ac", "climate", options={"particles": args.ac_particles})
+            runs.append((f"ac x{args.ac_particles}", None, registry))
+        if args.tk:
+            print(f"{'scenario':<12} {'updates':>8} {'Tcl calls/frame':>16}")
+            for name, appliances, registry in runs:
+                updates, calls = measure_tcl_calls(appliances, args.seconds, args.seed, registry)
+                print(f"{name:<12} {updates:>8} {calls:>16.2f}")
+            return
+        print(f"{'scenario':<12} {'updates':>8} {'frames/s':>10} {'items/frame':>12} "
+              f"{'calls/frame':>12} {'alloc B/frame':>14} {'live items':>11} {'cache hit/miss':>15}")
+        for name, appliances, registry in runs:
+            speed = measure_speed(appliances, args.seconds, args.seed, canvas, registry)
+            alloc = measure_allocations(appliances, args.seconds, args.seed, canvas, registry)
+            print(f"{name:<12} {speed['updates']:>8} {speed['fps']:>10.0f} "
+                  f"{speed['items_per_frame']:>12.2f} {speed['calls_per_frame']:>12.2f} "
+                  f"{alloc:>14.0f} {speed['live_items']:>11} "
+                  f"{speed['cache_hits']:>8}/{speed['cache_misses']:<6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from control_api import ControlBridge, ControlServer
+from headless import HeadlessBackend, HeadlessRoot, NullCanvas
+from home_control import HomeApplianceControl
+
+
+def build_app():
+    root = HeadlessRoot()
+    app = HomeApplianceControl(root, HeadlessBackend(canvas=NullCanvas))
+    main_thread = threading.get_ident()
+    off_thread = {"calls": 0}
+    toggle = app.toggle_appliance
+
+    def checked_toggle(device_id):
+        if threading.get_ident() != main_thread:
+            off_thread["calls"] += 1
+        toggle(device_id)
+
+    app.toggle_appliance = checked_toggle
+    return root, app, off_thread
+
+
+def random_batch(rng, devices, size):
+    batch = []
+    for _ in range(size):
+        op = rng.choice(("set", "toggle", "get"))
+        command = {"op": op, "device": rng.choice(devices)}
+        if op == "set":
+            command["state"] = rng.random() < 0.5
+        batch.append(command)
+    return batch
+
+
+async def client(port, path, seconds, batch_size, depth, seed, devices, latencies, errors):
+    if path:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    rng = random.Random(seed)
+    sent = {}
+    next_id = 0
+    deadline = time.perf_counter() + seconds
+
+    async def send():
+        nonlocal next_id
+        next_id += 1
+        sent[next_id] = time.perf_counter()
+        request = {"id": next_id, "commands": random_batch(rng, devices, batch_size)}
+        writer.write(json.dumps(request).encode() + b"\n")
+
+    for _ in range(depth):
+        await send()
+    await writer.drain()
+    while sent:
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - sent.pop(response["id"]))
+        if "error" in response or any("error" in result for result in response["results"]):
+            errors.append(response)
+        if time.perf_counter() < deadline:
+            await send()
+            await writer.drain()
+    writer.close()
+
+
+def run_clients(args, port, path, devices, results):
+    async def run_all():
+        await asyncio.gather(*(
+            client(port, path, args.seconds, args.batch, args.depth, args.seed + i, devices,
+                   results["latencies"], results["errors"])
+            for i in range(args.clients)
+        ))
+
+    start = time.perf_counter()
+    asyncio.run(run_all())
+    results["wall"] = time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Loopback load test for the control API")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--batch", type=int, default=10, help="commands per request")
+    parser.add_argument("--depth", type=int, default=4, help="requests in flight per client")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--unix", action="store_true", help="use a Unix socket instead of TCP")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        root, app, off_thread = build_app()
+        bridge = ControlBridge(app)
+        path = os.path.join(workdir, "control.sock") if args.unix else None
+        server = ControlServer(bridge, port=0, path=path)
+        server.start()
+
+        results = {"latencies": [], "errors": []}
+        devices = list(app.appliance_states)
+        clients = threading.Thread(target=run_clients, args=(args, server.port, path, devices, results))
+        clients.start()
+        root.run_realtime(args.seconds + 30, until=lambda: not clients.is_alive())
+        clients.join()
+        server.stop()
+        app.on_close()
+
+    latencies = sorted(results["latencies"])
+    requests = len(latencies)
+    p50 = statistics.median(latencies) * 1000 if latencies else 0.0
+    p99 = latencies[int(0.99 * (requests - 1))] * 1000 if latencies else 0.0
+    print(f"clients {args.clients}, batch {args.batch}, depth {args.depth}, "
+          f"{'unix socket' if args.unix else 'tcp'}")
+    print(f"requests       {requests:>10}")
+    print(f"commands       {bridge.commands_run:>10}")
+    print(f"commands/s     {bridge.commands_run / results['wall']:>10.0f}")
+    print(f"latency p50    {p50:>9.2f} ms")
+    print(f"latency p99    {p99:>9.2f} ms")
+    print(f"longest drain  {bridge.longest_drain_ms:>9.2f} ms")
+    print(f"errors         {len(results['errors']):>10}")
+    print(f"off-thread Tk  {off_thread['calls']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from devices import DeviceRegistry, house_config
+from headless import HeadlessBackend, HeadlessRoot
+from home_control import HomeApplianceControl
+
+TRACE_VERSION = 1
+PATTERNS = ("random", "burst", "scene", "mixed")
+MIXED_WEIGHTS = {"random": 80, "burst": 12, "scene": 6, "save": 2}
+BURST_SPACING = 0.002
+WARMUP_MS = 1000
+
+
+def synthetic_trace(registry, pattern, rate, seconds, seed):
+    rng = random.Random(seed)
+    devices = list(registry.devices)
+    groups = ["all"] + list(registry.sections)
+    kinds, weights = zip(*MIXED_WEIGHTS.items())
+    events = []
+    t = 0.0
+    while t < seconds:
+        kind = rng.choices(kinds, weights)[0] if pattern == "mixed" else pattern
+        if kind == "burst":
+            count = rng.randint(5, 20)
+            for i in range(count):
+                events.append({"t": round(t + i * BURST_SPACING, 6), "op": "toggle", "device": rng.choice(devices)})
+            t += rng.expovariate(rate / count)
+            continue
+        if kind == "scene":
+            events.append({"t": round(t, 6), "op": "apply", "states": {rng.choice(groups): rng.random() < 0.5}})
+        elif kind == "save":
+            events.append({"t": round(t, 6), "op": "save"})
+        else:
+            events.append({"t": round(t, 6), "op": "toggle", "device": rng.choice(devices)})
+        t += rng.expovariate(rate)
+    return [event for event in events if event["t"] < seconds]
+
+
+def journal_trace(directory, speed):
+    from journal import Journal
+    if not os.path.isdir(directory):
+        raise SystemExit(f"no journal at {directory}")
+    journal = Journal(directory, read_only=True)
+    try:
+        records = list(journal.events(0.0, float("inf")))
+    finally:
+        journal.close()
+    if not records:
+        return []
+    first = records[0][0]
+    return [
+        {"t": round((timestamp - first) / speed, 6), "op": "set", "device": device_id, "state": new}
+        for timestamp, device_id, _old, new in records
+    ]
+
+
+def save_trace(path, header, events):
+    with open(path, "w") as f:
+        f.write(json.dumps(header) + "\n")
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+
+
+def load_trace(path):
+    with open(path, "r") as f:
+        header = json.loads(f.readline())
+        if not isinstance(header, dict) or header.get("trace") != TRACE_VERSION:
+            raise SystemExit(f"{path} is not a version {TRACE_VERSION} trace")
+        return header, [json.loads(line) for line in f if line.strip()]
+
+
+def valid_event(registry, event):
+    if not isinstance(event, dict) or not isinstance(event.get("t"), (int, float)):
+        return False
+    op = event.get("op")
+    if op in ("toggle", "set"):
+        known = isinstance(event.get("device"), str) and event["device"] in registry
+        return known and (op == "toggle" or isinstance(event.get("state"), bool))
+    if op == "apply":
+        try:
+            registry.check_states(event.get("states"), "apply event")
+        except ValueError:
+            return False
+        return True
+    return op == "save"
+
+
+def run_trace(registry, events, seed, realtime=True, save_each=False):
+    random.seed(seed)
+    root = HeadlessRoot()
+    app = HomeApplianceControl(root, HeadlessBackend(), registry=registry)
+    app.apply_states({"all": True}, "Load test")
+    root.advance(WARMUP_MS)
+    app.state_writer.flush()
+    for canvas in app.animation_canvases.values():
+        canvas.reset_counters()
+
+    journal_writes = [0]
+    flush_journal = app.journal.flush
+
+    def counted_flush():
+        if app.journal.buffer:
+            journal_writes[0] += 1
+        flush_journal()
+
+    app.journal.flush = counted_flush
+    state_writes = app.state_writer.writes
+    store_sequence = app.state_store.sequence
+    latencies = []
+    started = [0.0]
+
+    def repainted(due):
+        latencies.append(time.perf_counter() - due)
+
+    def fire(event):
+        due = started[0] + event["t"] if realtime else time.perf_counter()
+        op = event["op"]
+        if op == "toggle":
+            app.toggle_appliance(event["device"])
+        elif op == "set":
+            if app.appliance_states[event["device"]] != event["state"]:
+                app.toggle_appliance(event["device"])
+        elif op == "apply":
+            app.apply_states(event["states"], "Load test")
+        elif op == "save":
+            app.save_states()
+        if save_each and op != "save":
+            app.save_states()
+        root.after_idle(repainted, due)
+
+    for event in events:
+        root.after(event["t"] * 1000, fire, event)
+    duration = events[-1]["t"] if events else 0.0
+    started[0] = time.perf_counter()
+    if realtime:
+        root.run_realtime(duration + 30, until=lambda: len(latencies) == len(events))
+    else:
+        root.advance(duration * 1000 + 1)
+    elapsed = time.perf_counter() - started[0]
+    canvas_calls = sum(sum(canvas.calls.values()) for canvas in app.animation_canvases.values())
+    animations = len(app.clock.subscribers)
+    final_states = dict(app.appliance_states)
+    app.on_close()
+
+    latencies.sort()
+    digest = hashlib.sha1(json.dumps(final_states, sort_keys=True).encode())
+    if not realtime:
+        digest.update(str(canvas_calls).encode())
+    return {
+        "events": len(events),
+        "duration": duration,
+        "elapsed": elapsed,
+        "offered_per_s": len(events) / duration if duration else 0.0,
+        "handled_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        "state_writes": app.state_writer.writes - state_writes,
+        "journal_writes": journal_writes[0],
+        "store_updates": (app.state_store.sequence - store_sequence) // 2,
+        "canvas_calls": canvas_calls,
+        "animations": animations,
+        "digest": digest.hexdigest()[:12],
+        "virtual": not realtime,
+    }
+
+
+def in_workdir(function, *args, **kwargs):
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            os.chdir(cwd)
+
+
+def report(result, realtime):
+    print(f"  offered        {result['offered_per_s']:>10,.0f} events/s over {result['duration']:.1f} s")
+    print(f"  handled        {result['handled_per_s']:>10,.0f} events/s "
+          f"({result['elapsed']:.2f} s {'wall' if realtime else 'to process the trace'})")
+    print(f"  click->repaint p50 {result['p50_ms']:.2f} ms  p99 {result['p99_ms']:.2f} ms  max {result['max_ms']:.2f} ms")
+    print(f"  writes         state file {result['state_writes']}, journal {result['journal_writes']}, "
+          f"store updates {result['store_updates']}")
+    print(f"  animations     {result['animations']} running, {result['canvas_calls']} canvas calls")
+    print(f"  digest         {result['digest']}")
+
+
+def compare(result, baseline):
+    print("  change vs baseline:")
+    for key in ("handled_per_s", "p50_ms", "p99_ms", "max_ms", "state_writes", "journal_writes", "canvas_calls"):
+        old, new = baseline.get(key), result[key]
+        if old is None:
+            continue
+        change = f"{(new - old) / old:+.1%}" if old else "n/a"
+        print(f"    {key:<15} {old:>12,.2f} -> {new:>12,.2f}  {change}")
+    if baseline.get("virtual") == result["virtual"] and baseline.get("digest") != result["digest"]:
+        print("    digest differs: the replay did not end in the same state")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive recorded or synthetic clicks through the control path")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--replay", metavar="TRACE", help="replay a saved trace")
+    source.add_argument("--from-journal", metavar="DIR", help="build a trace from an appliance journal")
+    parser.add_argument("--pattern", choices=PATTERNS, default="mixed")
+    parser.add_argument("--rate", type=float, default=100.0, help="synthetic events per second")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression for journal traces")
+    parser.add_argument("--house", type=int, metavar="N", help="use a generated house with N devices")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record", metavar="TRACE", help="save the trace before running it")
+    parser.add_argument("--virtual", action="store_true",
+                        help="run on virtual time as fast as possible; repeat runs give identical digests")
+    parser.add_argument("--save-each", action="store_true", help="save the configuration after every click")
+    parser.add_argument("--ramp", action="store_true", help="double the rate until clicks lag")
+    parser.add_argument("--lag-ms", type=float, default=50.0, help="p99 click->repaint that counts as lagging")
+    parser.add_argument("--results", metavar="JSON", help="write the results for a later --baseline")
+    parser.add_argument("--baseline", metavar="JSON", help="compare with results from an earlier run")
+    args = parser.parse_args()
+
+    if args.replay:
+        header, events = load_trace(args.replay)
+    else:
+        header = {"trace": TRACE_VERSION, "house": args.house, "seed": args.seed}
+        events = None
+    registry = DeviceRegistry.from_config(house_config(header["house"])) if header["house"] else DeviceRegistry.load()
+    if args.from_journal:
+        events = journal_trace(args.from_journal, args.speed)
+        header["source"] = os.path.abspath(args.from_journal)
+    elif events is None:
+        header.update(pattern=args.pattern, rate=args.rate, seconds=args.seconds)
+        events = synthetic_trace(registry, args.pattern, args.rate, args.seconds, args.seed)
+    known = [event for event in events if valid_event(registry, event)]
+    if len(known) != len(events):
+        print(f"skipping {len(events) - len(known)} events that do not fit this house")
+        events = known
+    if args.record:
+        save_trace(args.record, header, events)
+    realtime = not args.virtual
+
+    if args.ramp:
+        rate = args.rate
+        sustained = None
+        while True:
+            trace = synthetic_trace(registry, args.pattern, rate, args.seconds, header["seed"])
+            result = in_workdir(run_trace, registry, trace, header["seed"], realtime, args.save_each)
+            print(f"{rate:>8,.0f} events/s offered: handled {result['handled_per_s']:>8,.0f}/s, "
+                  f"p99 {result['p99_ms']:.2f} ms, state writes {result['state_writes']}", flush=True)
+            if result["p99_ms"] > args.lag_ms or result["handled_per_s"] < 0.95 * result["offered_per_s"]:
+                break
+            sustained = rate
+            rate *= 2
+        print(f"sustains {sustained or 0:,.0f} events/s before p99 click->repaint passes {args.lag_ms:g} ms"
+              if sustained else f"lags already at {args.rate:,.0f} events/s")
+        return
+
+    print(f"{len(events)} events on {len(registry)} devices, seed {header['seed']}, "
+          f"{'real time' if realtime else 'virtual time'}{', saving every click' if args.save_each else ''}")
+    result = in_workdir(run_trace, registry, events, header["seed"], realtime, args.save_each)
+    report(result, realtime)
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            compare(result, json.load(f))
+    if args.results:
+        with open(args.results, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
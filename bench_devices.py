@@ -0,0 +1,103 @@
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from device_server import DeviceServer
+from devices import DeviceRegistry, house_config
+from headless import HeadlessBackend, HeadlessRoot, NullCanvas
+from home_control import HomeApplianceControl
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and latency of the device link against the simulator")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--house", type=int, default=1000, metavar="N", help="devices in the generated house")
+    parser.add_argument("--window", type=int, default=200, help="devices with a change in flight at once")
+    parser.add_argument("--latency", type=float, default=20.0, help="simulated gateway latency in ms")
+    parser.add_argument("--jitter", type=float, default=10.0, help="mean extra latency in ms")
+    parser.add_argument("--error", type=float, default=0.01, help="chance that one command fails")
+    parser.add_argument("--drop", type=float, default=0.0, help="chance that a request is never answered")
+    parser.add_argument("--pool", type=int, default=2, help="connections per gateway")
+    parser.add_argument("--batch", type=int, default=64, help="most commands per request")
+    parser.add_argument("--timeout", type=float, default=0.5)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--unix", action="store_true", help="use a Unix socket instead of TCP")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        path = os.path.join(workdir, "gateway.sock") if args.unix else None
+        server = DeviceServer(port=0, path=path, latency_ms=args.latency, jitter_ms=args.jitter,
+                              error_rate=args.error, drop_rate=args.drop, seed=args.seed)
+        server.start()
+
+        config = house_config(args.house)
+        config["gateways"] = [{
+            "id": "bench", "adapter": "jsonl", "pool": args.pool, "batch": args.batch,
+            "timeout": args.timeout, "retries": args.retries, **({"path": path} if path else {"port": server.port}),
+        }]
+        for device in config["devices"]:
+            device["gateway"] = "bench"
+        registry = DeviceRegistry.from_config(config)
+
+        root = HeadlessRoot()
+        app = HomeApplianceControl(root, HeadlessBackend(canvas=NullCanvas), registry=registry)
+        link = app.device_link
+        link.latencies = []
+        rng = random.Random(args.seed)
+        devices = list(registry.devices)
+        stalls = [0.0]
+        last_beat = [time.perf_counter()]
+        reverted = [0]
+        reconcile = app.reconcile
+
+        def counting_reconcile(results):
+            reverted[0] += sum(1 for _device_id, _state, error in results if error is not None)
+            reconcile(results)
+
+        def heartbeat():
+            now = time.perf_counter()
+            stalls[0] = max(stalls[0], now - last_beat[0])
+            last_beat[0] = now
+            root.after(1, heartbeat)
+
+        def top_up():
+            while len(link.waiting) < args.window:
+                device_id = rng.choice(devices)
+                if device_id not in link.waiting:
+                    app.toggle_appliance(device_id)
+            root.after(1, top_up)
+
+        link.on_results = counting_reconcile
+        root.after(1, heartbeat)
+        root.after(1, top_up)
+        started = time.perf_counter()
+        root.run_realtime(args.seconds)
+        elapsed = time.perf_counter() - started
+        root.queue = [entry for entry in root.queue if entry[3] not in (top_up, heartbeat)]
+        root.run_realtime((args.timeout + 1) * (args.retries + 1), until=lambda: not link.waiting)
+
+        latencies = sorted(link.latencies)
+        clients = list(link.clients.values())
+        requests = sum(client.requests for client in clients)
+        print(f"{len(registry)} devices, window {args.window}, {args.pool} connections, batch {args.batch}, "
+              f"gateway {args.latency:g}+{args.jitter:g} ms, {args.error:.1%} errors, {args.drop:.1%} drops")
+        print(f"  changes settled  {len(latencies):>8}  ({len(latencies) / elapsed:,.0f}/s)")
+        print(f"  latency          p50 {statistics.median(latencies) * 1000:.1f} ms  "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms  max {latencies[-1] * 1000:.1f} ms")
+        print(f"  requests         {requests:>8}  ({link.sent / max(requests, 1):.1f} changes each, "
+              f"{sum(client.retried for client in clients)} retries, "
+              f"{sum(client.adapter.connects for client in clients)} connections opened)")
+        print(f"  reverted         {reverted[0]:>8}  (gateway errors {server.errors}, dropped {server.dropped})")
+        print(f"  longest Tk stall {stalls[0] * 1000:>8.1f} ms")
+        app.on_close()
+        server.stop()
+        os.chdir("/")
+
+
+if __name__ == "__main__":
+    main()
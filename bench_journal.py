@@ -0,0 +1,96 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from journal import RECORD, Journal
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a long synthetic journal and check rotation and retention")
+    parser.add_argument("--days", type=int, default=500, help="days of history to write")
+    parser.add_argument("--per-day", type=int, default=2000, help="state changes per day")
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--retention", type=int, default=400, metavar="DAYS")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    devices = [f"device_{i}" for i in range(args.devices)]
+    states = {}
+    checkpoints = []
+    end = time.time()
+    start = end - args.days * 86400
+    problems = []
+
+    with tempfile.TemporaryDirectory() as workdir:
+        directory = os.path.join(workdir, "appliance_journal")
+        journal = Journal(directory, retention_days=args.retention)
+        started = time.perf_counter()
+        for day in range(args.days):
+            for i in range(args.per_day):
+                timestamp = start + (day + i / args.per_day) * 86400
+                device_id = rng.choice(devices)
+                new = not states.get(device_id, False)
+                journal.append(device_id, not new, new, timestamp)
+                states[device_id] = new
+            checkpoints.append((timestamp + 1, dict(states)))
+        journal.close()
+        written = time.perf_counter() - started
+        records = args.days * args.per_day
+        print(f"{records} changes over {args.days} days on {args.devices} devices")
+        print(f"  append        {written:.2f} s   {written / records * 1e6:.2f} us/change")
+
+        started = time.perf_counter()
+        journal = Journal(directory, retention_days=args.retention)
+        reopened = time.perf_counter() - started
+        print(f"  reopen        {reopened * 1000:.1f} ms")
+        oldest = journal.segments[1].start if len(journal.segments) > 1 else journal.last_timestamp
+        kept_days = (journal.last_timestamp - journal.segments[0].start) / 86400
+        print(f"  segments      {len(journal.segments)} kept, covering {kept_days:.1f} days")
+        if len(journal.segments) < min(args.days, args.retention):
+            problems.append(f"only {len(journal.segments)} segments: the journal did not rotate daily")
+        if journal.last_timestamp - oldest > args.retention * 86400:
+            problems.append(f"segments older than {args.retention} days were not removed")
+        on_disk = sorted(name for name in os.listdir(directory) if name.startswith("segment-"))
+        if len(on_disk) != 2 * len(journal.segments):
+            problems.append(f"{len(on_disk)} segment files on disk for {len(journal.segments)} segments")
+        if journal.current_state() != states:
+            problems.append("reopened state differs from the written state")
+        horizon = journal.segments[0].start
+        for timestamp, expected in checkpoints[::max(1, len(checkpoints) // 20)]:
+            if timestamp >= horizon and journal.state_at(timestamp) != expected:
+                problems.append(f"state_at {timestamp:.0f} differs from the written state")
+        journal.close()
+
+        log_path = journal.segments[-1].log_path
+        with open(log_path, "ab") as f:
+            f.write(bytes(RECORD.size // 2))
+        size = os.path.getsize(log_path)
+        journal = Journal(directory, read_only=True)
+        if journal.current_state() != states:
+            problems.append("read-only open does not see the written state")
+        journal.close()
+        if os.path.getsize(log_path) != size:
+            problems.append("read-only open changed the log")
+        missing = os.path.join(workdir, "missing")
+        try:
+            Journal(missing, read_only=True)
+        except FileNotFoundError:
+            pass
+        if os.path.exists(missing):
+            problems.append("read-only open created a directory")
+        Journal(directory).close()
+        if os.path.getsize(log_path) % RECORD.size:
+            problems.append("writable open did not truncate a partial record")
+
+    for problem in problems:
+        print(f"  {problem}")
+    print(f"  problems      {len(problems)}")
+    if problems:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
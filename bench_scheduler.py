@@ -0,0 +1,102 @@
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from devices import DeviceRegistry, house_config
+from headless import HeadlessBackend, HeadlessRoot, NullCanvas
+from home_control import HomeApplianceControl
+from scheduler import Scheduler
+
+
+def random_rule(rng, registry, devices):
+    rule = {"state": rng.random() < 0.5}
+    if rng.random() < 0.01:
+        rule["states"] = {rng.choice(list(registry.sections)): rule.pop("state")}
+    else:
+        rule["device"] = rng.choice(devices)
+    kind = rng.random()
+    if kind < 0.6:
+        rule["at"] = f"{rng.randrange(24):02d}:{rng.randrange(60):02d}"
+        rule["days"] = rng.choice(("daily", "weekdays", "weekends"))
+    elif kind < 0.8:
+        rule["at"] = rng.choice(("sunrise", "sunset"))
+        rule["offset"] = rng.randrange(-60, 61)
+    else:
+        rule["after"] = rng.uniform(60, 86400)
+    return rule
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Insert and fire schedule rules against a headless panel")
+    parser.add_argument("--rules", type=int, default=100000)
+    parser.add_argument("--house", type=int, default=1000, metavar="N", help="devices in the generated house")
+    parser.add_argument("--days", type=float, default=1.0, help="virtual days to run")
+    parser.add_argument("--sleep", type=float, default=8.0, metavar="HOURS", help="simulated suspend at the end")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    registry = DeviceRegistry.from_config(house_config(args.house))
+    devices = list(registry.devices)
+    configs = [random_rule(rng, registry, devices) for _ in range(args.rules)]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        root = HeadlessRoot()
+        app = HomeApplianceControl(root, HeadlessBackend(canvas=NullCanvas), registry=registry)
+        app.clock.pause()
+        origin = [time.mktime(time.localtime()[:3] + (0, 0, 0, 0, 0, -1))]
+        scheduler = Scheduler(root, registry, app.apply_states, path=None, clock=lambda: origin[0] + root.now)
+        scheduler.location = (51.5, -0.13)
+        app.scheduler = scheduler
+
+        wakes = []
+        run_due = scheduler.run_due
+
+        def timed_run_due():
+            fired = scheduler.fired
+            started = time.perf_counter()
+            run_due()
+            wakes.append(((time.perf_counter() - started) * 1000, scheduler.fired - fired))
+
+        scheduler.run_due = timed_run_due
+
+        started = time.perf_counter()
+        for config in configs:
+            scheduler.add(config)
+        inserted = time.perf_counter() - started
+        print(f"{args.rules} rules on {len(registry)} devices")
+        print(f"  insert        {inserted:>8.2f} s   {inserted / args.rules * 1e6:>6.1f} us/rule  "
+              f"({scheduler.arms} timer arms)")
+
+        arms = scheduler.arms
+        started = time.perf_counter()
+        root.advance(args.days * 86400 * 1000)
+        elapsed = time.perf_counter() - started
+        batches = [wake for wake in wakes if wake[1]]
+        costs = sorted(cost for cost, _count in batches)
+        print(f"  {args.days:g} day(s)     {elapsed:>8.2f} s   {scheduler.fired} rules fired in {len(batches)} batches, "
+              f"{len(wakes)} wakeups, {scheduler.arms - arms} timer arms")
+        print(f"  batch         p50 {statistics.median(costs):.2f} ms  p99 {costs[int(len(costs) * 0.99)]:.2f} ms  "
+              f"max {costs[-1]:.2f} ms  largest {max(count for _cost, count in batches)} rules")
+
+        wakes.clear()
+        fired = scheduler.fired
+        origin[0] += args.sleep * 3600
+        started = time.perf_counter()
+        root.advance(scheduler.max_wait * 1000)
+        elapsed = time.perf_counter() - started
+        print(f"  resume after {args.sleep:g} h: {scheduler.fired - fired} rules caught up in "
+              f"{sum(1 for wake in wakes if wake[1])} batch, {len(wakes)} callbacks, {elapsed * 1000:.0f} ms total, "
+              f"longest callback {max(cost for cost, _count in wakes):.1f} ms")
+        app.on_close()
+        print(f"  live rules {len(scheduler.rules)}, heap {len(scheduler.heap)}, "
+              f"state file writes {app.state_writer.writes}")
+        os.chdir("/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from devices import DeviceRegistry, house_config
+from headless import HeadlessBackend, HeadlessRoot
+from home_control import HomeApplianceControl
+
+
+def check(app):
+    problems = []
+    visible = set()
+    for section_id, device_list in app.device_lists.items():
+        for row, device in zip(device_list.rows, device_list.visible_devices()):
+            visible.add(device.id)
+            state = app.appliance_states[device.id]
+            if row.device_id != device.id:
+                problems.append(f"{section_id}: row shows {row.device_id}, expected {device.id}")
+            if app.buttons.get(device.id) is not row.button:
+                problems.append(f"{device.id}: button mapping points at another row")
+            if app.animation_canvases.get(device.id) is not row.canvas:
+                problems.append(f"{device.id}: canvas mapping points at another row")
+            if row.button.cget("text") != ("ON" if state else "OFF"):
+                problems.append(f"{device.id}: button reads {row.button.cget('text')} but is {state}")
+            if app.clock.is_registered(device.id) != state:
+                problems.append(f"{device.id}: animating {app.clock.is_registered(device.id)} but is {state}")
+    for name, mapping in (("button", app.buttons), ("canvas", app.animation_canvases)):
+        if set(mapping) != visible:
+            problems.append(f"{name} mappings differ from the visible rows on {sorted(set(mapping) ^ visible)}")
+    hidden = set(app.clock.subscribers) - visible
+    if hidden:
+        problems.append(f"animating devices that are not visible: {sorted(hidden)}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scroll the virtual device lists and check every row stays in sync")
+    parser.add_argument("--house", type=int, default=30, metavar="N", help="devices in the generated house")
+    parser.add_argument("--steps", type=int, default=200, help="random scroll steps per section")
+    parser.add_argument("--on", type=float, default=1.0, help="share of devices switched on")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    rng = random.Random(args.seed)
+    registry = DeviceRegistry.from_config(house_config(args.house))
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        root = HeadlessRoot()
+        app = HomeApplianceControl(root, HeadlessBackend(), registry=registry)
+        app.apply_states({device.id: rng.random() < args.on for device in registry}, "Scroll test")
+        root.advance(1000)
+
+        moves = [
+            ("wheel down", lambda device_list: device_list.on_wheel(type("Event", (), {"num": 5})())),
+            ("wheel up", lambda device_list: device_list.on_wheel(type("Event", (), {"num": 4})())),
+            ("unit down", lambda device_list: device_list.on_scroll("scroll", "1", "units")),
+            ("unit up", lambda device_list: device_list.on_scroll("scroll", "-1", "units")),
+            ("page down", lambda device_list: device_list.on_scroll("scroll", "1", "pages")),
+            ("page up", lambda device_list: device_list.on_scroll("scroll", "-1", "pages")),
+            ("jump", lambda device_list: device_list.on_scroll("moveto", str(rng.random()))),
+        ]
+        costs = []
+        failures = 0
+        for section_id, device_list in app.device_lists.items():
+            for step in range(args.steps):
+                name, move = rng.choice(moves)
+                started = time.perf_counter()
+                move(device_list)
+                costs.append((time.perf_counter() - started) * 1000)
+                row = rng.choice(device_list.rows)
+                clicked = row.device_id
+                row.button.invoke()
+                root.advance(50)
+                problems = check(app)
+                if problems:
+                    failures += 1
+                    print(f"{section_id} step {step} after {name}, clicked {clicked}:")
+                    for problem in problems:
+                        print(f"  {problem}")
+                    break
+
+        costs.sort()
+        print(f"{len(registry)} devices, {len(costs)} scroll steps with a click after each")
+        print(f"  scroll        p50 {statistics.median(costs):.3f} ms  p99 {costs[int(len(costs) * 0.99)]:.3f} ms  "
+              f"max {costs[-1]:.3f} ms")
+        print(f"  out of sync   {failures} section(s)")
+        app.on_close()
+        os.chdir("/")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
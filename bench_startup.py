@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+
+
+def child(argv):
+    started = time.perf_counter()
+    from devices import DeviceRegistry, house_config
+    from home_control import HomeApplianceControl
+    imported = time.perf_counter()
+
+    use_tk = "--tk" in argv
+    house = int(argv[argv.index("--house") + 1]) if "--house" in argv else None
+    registry = DeviceRegistry.from_config(house_config(house)) if house else None
+    painted = []
+    if use_tk:
+        import tkinter as tk
+        root = tk.Tk()
+        app = HomeApplianceControl(root, registry=registry)
+        built = time.perf_counter()
+
+        def on_expose(event):
+            if not painted:
+                painted.append((time.perf_counter(), len(app.clock.subscribers)))
+
+        root.bind("<Expose>", on_expose, add="+")
+        while not painted:
+            root.update()
+            time.sleep(0.001)
+    else:
+        from headless import HeadlessBackend, HeadlessRoot
+        root = HeadlessRoot()
+        app = HomeApplianceControl(root, HeadlessBackend(), registry=registry)
+        built = time.perf_counter()
+        root.update()
+        painted.append((time.perf_counter(), len(app.clock.subscribers)))
+    first_paint, started_animations = painted[0]
+
+    wanted = [device_id for device_id in app.animation_canvases if app.appliance_states[device_id]]
+
+    def all_live():
+        return all(app.clock.is_registered(device_id) for device_id in wanted)
+
+    if use_tk:
+        while not all_live():
+            root.update()
+            time.sleep(0.001)
+    else:
+        root.run_realtime(10, until=all_live)
+    live = time.perf_counter()
+    app.on_close()
+
+    import json
+    print(json.dumps({
+        "import": (imported - started) * 1000,
+        "build": (built - imported) * 1000,
+        "first paint": (first_paint - started) * 1000,
+        "all live": (live - started) * 1000,
+        "animations at first paint": started_animations,
+        "animations": len(wanted),
+    }))
+
+
+def main():
+    import argparse
+    import json
+    import statistics
+    import subprocess
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Startup time: import, first paint and all animations live")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--house", type=int, metavar="N", help="start a generated house with N devices")
+    parser.add_argument("--off", action="store_true", help="start with every appliance off instead of on")
+    parser.add_argument("--tk", action="store_true", help="use a real Tk window (needs a display)")
+    args = parser.parse_args()
+
+    from devices import DeviceRegistry, house_config
+    registry = DeviceRegistry.from_config(house_config(args.house)) if args.house else DeviceRegistry.load()
+    command = [sys.executable, os.path.abspath(__file__), "--child"]
+    if args.house:
+        command += ["--house", str(args.house)]
+    if args.tk:
+        command.append("--tk")
+
+    runs = []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as workdir:
+            with open(os.path.join(workdir, "appliance_states.json"), "w") as f:
+                json.dump({device.id: not args.off for device in registry}, f)
+            output = subprocess.run(command, cwd=workdir, capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(output))
+
+    print(f"{args.runs} runs, {len(registry)} devices, {'off' if args.off else 'on'}, "
+          f"{'tk' if args.tk else 'headless'}; medians:")
+    for key in ("import", "build", "first paint", "all live"):
+        print(f"  {key:<12} {statistics.median(run[key] for run in runs):>8.1f} ms")
+    early = max(run["animations at first paint"] for run in runs)
+    print(f"  animations running at first paint: {early} of {runs[0]['animations']}")
+    if early:
+        raise SystemExit("animations must not start before the first paint")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(sys.argv[2:])
+    else:
+        main()
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+
+CONTROL_HOST = "127.0.0.1"
+CONTROL_PORT = 8765
+CONTROL_POLL_MS = 10
+CONTROL_IDLE_MS = 160
+DRAIN_BUDGET_MS = 5.0
+
+
+class CommandError(Exception):
+    pass
+
+
+def execute(app, command):
+    op = command.get("op")
+    if op == "list":
+        return {
+            "devices": [
+                {"device": device.id, "name": device.name, "type": device.type,
+                 "section": device.section, "state": app.appliance_states[device.id]}
+                for device in app.registry
+            ]
+        }
+    if op == "get" and "device" not in command:
+        return {"states": dict(app.appliance_states)}
+    if op == "scene":
+        if not isinstance(command.get("scene"), str) or command["scene"] not in app.registry.scenes:
+            raise CommandError(f"unknown scene {command.get('scene')!r}")
+        return {"changed": app.apply_scene(command["scene"])}
+    if op == "apply":
+        states = command.get("states")
+        if not isinstance(states, dict) or not all(isinstance(v, bool) for v in states.values()):
+            raise CommandError("'apply' needs a 'states' object of booleans")
+        try:
+            return {"changed": app.apply_states(states)}
+        except KeyError as e:
+            raise CommandError(f"unknown device {e.args[0]!r}") from None
+
+    if op == "schedule":
+        config = {key: value for key, value in command.items() if key != "op"}
+        try:
+            rule = app.scheduler.add(config)
+        except (TypeError, ValueError) as e:
+            raise CommandError(str(e)) from None
+        return {"rule": rule.id, "due": rule.due}
+    if op == "unschedule":
+        try:
+            rule = app.scheduler.remove(command.get("rule"))
+        except (KeyError, TypeError):
+            raise CommandError(f"unknown rule {command.get('rule')!r}") from None
+        return {"removed": rule.id}
+    if op == "rules":
+        return {"rules": [dict(rule.config, due=rule.due) for rule in app.scheduler.upcoming()]}
+
+    if not isinstance(command.get("device"), str):
+        raise CommandError(f"'{op}' needs a 'device' name")
+    device = app.registry.resolve(command["device"])
+    if device is None:
+        raise CommandError(f"unknown device {command.get('device')!r}")
+
+    if op == "get":
+        pass
+    elif op == "set":
+        state = command.get("state")
+        if not isinstance(state, bool):
+            raise CommandError("'set' needs a boolean 'state'")
+        if app.appliance_states[device.id] != state:
+            app.toggle_appliance(device.id)
+    elif op == "toggle":
+        app.toggle_appliance(device.id)
+    else:
+        raise CommandError(f"unknown op {op!r}")
+    return {"device": device.id, "state": app.appliance_states[device.id]}
+
+
+def set_result(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+class ControlBridge:
+    def __init__(self, app, poll_ms=CONTROL_POLL_MS, idle_ms=CONTROL_IDLE_MS, budget_ms=DRAIN_BUDGET_MS):
+        self.app = app
+        self.poll_ms = poll_ms
+        self.idle_ms = idle_ms
+        self.delay = poll_ms
+        self.budget_ms = budget_ms
+        self.requests = queue.SimpleQueue()
+        self.after_id = None
+        self.commands_run = 0
+        self.longest_drain_ms = 0.0
+
+    def start(self):
+        if self.after_id is None:
+            self.after_id = self.app.root.after(self.poll_ms, self.poll)
+
+    def stop(self):
+        if self.after_id is not None:
+            self.app.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def submit(self, commands, loop, future):
+        self.requests.put((commands, loop, future))
+
+    def poll(self):
+        handled = 0
+        try:
+            handled = self.drain()
+        finally:
+            if handled or not self.requests.empty():
+                self.delay = self.poll_ms
+            else:
+                self.delay = min(self.delay * 2, self.idle_ms)
+            self.after_id = self.app.root.after(self.delay, self.poll)
+
+    def drain(self):
+        started = time.perf_counter()
+        deadline = started + self.budget_ms / 1000
+        handled = 0
+        while time.perf_counter() < deadline:
+            try:
+                commands, loop, future = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            results = []
+            for command in commands:
+                try:
+                    results.append(execute(self.app, command))
+                except CommandError as e:
+                    results.append({"error": str(e)})
+                except Exception as e:
+                    results.append({"error": f"{command.get('op')!r} failed: {type(e).__name__}: {e}"})
+            self.commands_run += len(commands)
+            handled += 1
+            try:
+                loop.call_soon_threadsafe(set_result, future, results)
+            except RuntimeError:
+                pass
+        self.longest_drain_ms = max(self.longest_drain_ms, (time.perf_counter() - started) * 1000)
+        return handled
+
+
+class JsonLineServer:
+    thread_name = "json-lines"
+
+    def __init__(self, host=CONTROL_HOST, port=CONTROL_PORT, path=None):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.error = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=self.thread_name, daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.server = self.loop.run_until_complete(self.listen())
+        except OSError as e:
+            self.error = e
+            self.ready.set()
+            self.loop.close()
+            return
+        if self.path is None:
+            self.port = self.server.sockets[0].getsockname()[1]
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+            self.loop.run_until_complete(self.server.wait_closed())
+            self.loop.close()
+
+    def listen(self):
+        if self.path is not None:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            return asyncio.start_unix_server(self.handle_client, path=self.path)
+        return asyncio.start_server(self.handle_client, self.host, self.port)
+
+    def stop(self):
+        if self.loop is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+    async def handle_client(self, reader, writer):
+        pending = set()
+        lock = asyncio.Lock()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.ensure_future(self.handle_request(line, writer, lock))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.wait(pending)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, line, writer, lock):
+        raise NotImplementedError
+
+    async def respond(self, writer, lock, response):
+        async with lock:
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+
+
+class ControlServer(JsonLineServer):
+    thread_name = "control-api"
+
+    def __init__(self, bridge, host=CONTROL_HOST, port=CONTROL_PORT, path=None):
+        super().__init__(host, port, path)
+        self.bridge = bridge
+
+    def start(self):
+        self.bridge.start()
+        super().start()
+
+    def stop(self):
+        self.bridge.stop()
+        super().stop()
+
+    async def handle_request(self, line, writer, lock):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if isinstance(request, dict) and "commands" in request:
+                request_id = request.get("id")
+                commands = request["commands"]
+            else:
+                commands = request if isinstance(request, list) else [request]
+            if not isinstance(commands, list) or not all(isinstance(c, dict) for c in commands):
+                raise ValueError("commands must be a list of JSON objects")
+            future = asyncio.get_running_loop().create_future()
+            self.bridge.submit(commands, asyncio.get_running_loop(), future)
+            response = {"id": request_id, "results": await future}
+        except ValueError as e:
+            response = {"id": request_id, "error": str(e)}
+        await self.respond(writer, lock, response)
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import random
+import time
+
+from control_api import CONTROL_HOST, JsonLineServer
+
+DEVICE_PORT = 9100
+
+
+class DeviceServer(JsonLineServer):
+    thread_name = "device-server"
+
+    def __init__(self, host=CONTROL_HOST, port=DEVICE_PORT, path=None, latency_ms=20.0, jitter_ms=10.0,
+                 error_rate=0.0, drop_rate=0.0, seed=None):
+        super().__init__(host, port, path)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.rng = random.Random(seed)
+        self.states = {}
+        self.requests = 0
+        self.commands = 0
+        self.errors = 0
+        self.dropped = 0
+
+    def delay(self):
+        jitter = self.rng.expovariate(1 / self.jitter_ms) if self.jitter_ms > 0 else 0.0
+        return (self.latency_ms + jitter) / 1000
+
+    def apply(self, command):
+        device_id = command.get("device")
+        self.commands += 1
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            return {"device": device_id, "error": "device did not respond"}
+        if "state" in command:
+            self.states[device_id] = bool(command["state"])
+        return {"device": device_id, "state": self.states.get(device_id, False)}
+
+    async def handle_request(self, line, writer, lock):
+        self.requests += 1
+        try:
+            request = json.loads(line)
+            request_id = request["id"]
+            commands = [command for command in request["commands"] if isinstance(command, dict)]
+        except (ValueError, KeyError, TypeError):
+            await self.respond(writer, lock, {"id": None, "error": "bad request"})
+            return
+        await asyncio.sleep(self.delay())
+        if self.rng.random() < self.drop_rate:
+            self.dropped += 1
+            return
+        await self.respond(writer, lock, {"id": request_id, "results": [self.apply(command) for command in commands]})
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Simulated device gateway for offline testing")
+    parser.add_argument("--port", type=int, default=DEVICE_PORT)
+    parser.add_argument("--socket", help="listen on a Unix socket instead of 127.0.0.1")
+    parser.add_argument("--latency", type=float, default=20.0, help="base response time in ms")
+    parser.add_argument("--jitter", type=float, default=10.0, help="mean extra response time in ms")
+    parser.add_argument("--error", type=float, default=0.0, help="chance that one command fails")
+    parser.add_argument("--drop", type=float, default=0.0, help="chance that a request is never answered")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = DeviceServer(port=args.port, path=args.socket, latency_ms=args.latency, jitter_ms=args.jitter,
+                          error_rate=args.error, drop_rate=args.drop, seed=args.seed)
+    server.start()
+    print(f"simulated gateway listening on {args.socket or f'{server.host}:{server.port}'}", flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    print(f"{server.requests} requests, {server.commands} commands, "
+          f"{server.errors} failed commands, {server.dropped} dropped requests")
+
+
+if __name__ == "__main__":
+    main()
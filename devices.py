@@ -0,0 +1,238 @@
+import json
+import os
+
+DEVICES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "devices.json")
+
+DEVICE_TYPES = ("light", "fan", "ac", "tv", "speaker", "radio")
+TYPE_LABELS = {
+    "light": "Light",
+    "fan": "Fan",
+    "ac": "AC",
+    "tv": "TV",
+    "speaker": "Speaker",
+    "radio": "Radio",
+}
+MAX_PARTICLES = 10000
+ANIMATION_OPTIONS = {
+    "ac": {"particles": (1, MAX_PARTICLES)},
+}
+
+
+class Section:
+    __slots__ = ("id", "title", "devices")
+
+    def __init__(self, section_id, title):
+        self.id = section_id
+        self.title = title
+        self.devices = []
+
+    def __repr__(self):
+        return f"Section({self.id!r}, {len(self.devices)} devices)"
+
+
+class Device:
+    __slots__ = ("id", "name", "type", "section", "animation", "options", "index", "room", "gateway")
+
+    def __init__(self, device_id, name, device_type, section, animation, options, index, room, gateway=None):
+        self.id = device_id
+        self.name = name
+        self.type = device_type
+        self.section = section
+        self.animation = animation
+        self.options = options
+        self.index = index
+        self.room = room
+        self.gateway = gateway
+
+    def __repr__(self):
+        return f"Device({self.id!r}, type={self.type!r}, section={self.section!r})"
+
+
+class Scene:
+    __slots__ = ("id", "name", "states")
+
+    def __init__(self, scene_id, name, states):
+        self.id = scene_id
+        self.name = name
+        self.states = states
+
+    def __repr__(self):
+        return f"Scene({self.id!r}, {len(self.states)} targets)"
+
+
+class Gateway:
+    __slots__ = ("id", "adapter", "options")
+
+    def __init__(self, gateway_id, adapter, options):
+        self.id = gateway_id
+        self.adapter = adapter
+        self.options = options
+
+    def __repr__(self):
+        return f"Gateway({self.id!r}, adapter={self.adapter!r})"
+
+
+class DeviceRegistry:
+    def __init__(self):
+        self.sections = {}
+        self.devices = {}
+        self.by_name = {}
+        self.scenes = {}
+        self.gateways = {}
+
+    @classmethod
+    def load(cls, path=DEVICES_FILE):
+        with open(path, "r") as f:
+            return cls.from_config(json.load(f))
+
+    @classmethod
+    def from_config(cls, config):
+        registry = cls()
+        for entry in config.get("sections", []):
+            registry.add_section(entry["id"], entry.get("title", entry["id"]))
+        for entry in config.get("gateways", []):
+            try:
+                options = {key: value for key, value in entry.items() if key not in ("id", "adapter")}
+                registry.add_gateway(entry["id"], entry["adapter"], options)
+            except KeyError as e:
+                raise ValueError(f"gateway entry {entry!r} is missing {e.args[0]!r}") from None
+        for entry in config.get("devices", []):
+            try:
+                device_id = entry["id"]
+                device_type = entry["type"]
+                section = entry["section"]
+            except KeyError as e:
+                raise ValueError(f"device entry {entry!r} is missing {e.args[0]!r}") from None
+            registry.add_device(
+                device_id,
+                entry.get("name", device_id),
+                device_type,
+                section,
+                entry.get("animation", device_type),
+                entry.get("options"),
+                entry.get("room"),
+                entry.get("gateway"),
+            )
+        for entry in config.get("scenes", []):
+            try:
+                registry.add_scene(entry["id"], entry.get("name", entry["id"]), entry["states"])
+            except KeyError as e:
+                raise ValueError(f"scene entry {entry!r} is missing {e.args[0]!r}") from None
+        return registry
+
+    def add_section(self, section_id, title):
+        if section_id in self.sections:
+            raise ValueError(f"duplicate section id {section_id!r}")
+        section = Section(section_id, title)
+        self.sections[section_id] = section
+        return section
+
+    def add_gateway(self, gateway_id, adapter, options=None):
+        if gateway_id in self.gateways:
+            raise ValueError(f"duplicate gateway id {gateway_id!r}")
+        gateway = Gateway(gateway_id, adapter, dict(options or {}))
+        self.gateways[gateway_id] = gateway
+        return gateway
+
+    def add_device(self, device_id, name, device_type, section_id, animation=None, options=None, room=None,
+                   gateway=None):
+        if device_id in self.devices:
+            raise ValueError(f"duplicate device id {device_id!r}")
+        if device_type not in DEVICE_TYPES:
+            raise ValueError(f"device {device_id!r} has unknown type {device_type!r}")
+        section = self.sections.get(section_id)
+        if section is None:
+            raise ValueError(f"device {device_id!r} refers to unknown section {section_id!r}")
+        if gateway is not None and gateway not in self.gateways:
+            raise ValueError(f"device {device_id!r} refers to unknown gateway {gateway!r}")
+        animation = animation or device_type
+        options = dict(options or {})
+        accepted = ANIMATION_OPTIONS.get(animation, {})
+        for key, value in options.items():
+            if key not in accepted:
+                raise ValueError(f"device {device_id!r} has unknown option {key!r} for animation {animation!r}")
+            low, high = accepted[key]
+            if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+                raise ValueError(f"device {device_id!r} option {key!r} must be a whole number from {low} to {high}")
+        device = Device(
+            device_id, name, device_type, section_id, animation, options, len(self.devices),
+            room or section_id, gateway,
+        )
+        self.devices[device_id] = device
+        self.by_name.setdefault(name, device)
+        section.devices.append(device)
+        return device
+
+    def add_scene(self, scene_id, name, states):
+        if scene_id in self.scenes:
+            raise ValueError(f"duplicate scene id {scene_id!r}")
+        self.check_states(states, f"scene {scene_id!r}")
+        scene = Scene(scene_id, name, dict(states))
+        self.scenes[scene_id] = scene
+        return scene
+
+    def check_states(self, states, owner):
+        if not isinstance(states, dict) or not states:
+            raise ValueError(f"{owner} needs at least one device or section")
+        for key, state in states.items():
+            if key != "all" and key not in self.sections and self.resolve(key) is None:
+                raise ValueError(f"{owner} refers to unknown device or section {key!r}")
+            if not isinstance(state, bool):
+                raise ValueError(f"{owner} has a non-boolean state for {key!r}")
+
+    def targets(self, states):
+        targets = {}
+        if "all" in states:
+            targets.update(dict.fromkeys(self.devices, states["all"]))
+        for key, state in states.items():
+            if key in self.sections:
+                targets.update((device.id, state) for device in self.sections[key].devices)
+        for key, state in states.items():
+            if key != "all" and key not in self.sections:
+                device = self.resolve(key)
+                if device is None:
+                    raise KeyError(key)
+                targets[device.id] = state
+        return targets
+
+    def resolve(self, key):
+        device = self.devices.get(key)
+        if device is None:
+            device = self.by_name.get(key)
+        return device
+
+    def __getitem__(self, device_id):
+        return self.devices[device_id]
+
+    def __contains__(self, device_id):
+        return device_id in self.devices
+
+    def __iter__(self):
+        return iter(self.devices.values())
+
+    def __len__(self):
+        return len(self.devices)
+
+
+def house_config(device_count, rooms_per_section=50):
+    groups = {
+        "lighting": ("Lighting Control", ("light",)),
+        "climate": ("Climate Control", ("fan", "ac")),
+        "entertainment": ("Entertainment", ("tv", "speaker", "radio")),
+    }
+    section_of = {t: section for section, (_, types) in groups.items() for t in types}
+    config = {
+        "sections": [{"id": section, "title": title} for section, (title, _) in groups.items()],
+        "devices": [],
+    }
+    for i in range(device_count):
+        device_type = DEVICE_TYPES[i % len(DEVICE_TYPES)]
+        room = (i // len(DEVICE_TYPES)) % rooms_per_section
+        config["devices"].append({
+            "id": f"{device_type}_{i}",
+            "name": f"Room {room + 1} {TYPE_LABELS[device_type]} {i}",
+            "type": device_type,
+            "section": section_of[device_type],
+            "room": f"room_{room + 1}",
+        })
+    return config
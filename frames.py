@@ -0,0 +1,54 @@
+import math
+
+BRIGHTNESS_STEPS = 20
+
+
+def fan_frame(angle):
+    blades = []
+    for i in range(4):
+        blade_angle = angle + (i * 90)
+        x1 = 20 + 5 * math.cos(math.radians(blade_angle))
+        y1 = 20 + 5 * math.sin(math.radians(blade_angle))
+        x2 = 20 + 18 * math.cos(math.radians(blade_angle))
+        y2 = 20 + 18 * math.sin(math.radians(blade_angle))
+        
+        tip_angle = blade_angle + 30
+        x3 = x2 + 5 * math.cos(math.radians(tip_angle))
+        y3 = y2 + 5 * math.sin(math.radians(tip_angle))
+        blades.append((x1, y1, x2, y2, x3, y3))
+    return tuple(blades)
+
+
+def brightness_color(brightness):
+    r = 255
+    g = 255
+    b = int(100 + brightness * 155)
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+def light_frame(step):
+    brightness = step / BRIGHTNESS_STEPS
+    return brightness_color(brightness), brightness_color(brightness * 0.7)
+
+
+def tv_frame(channel, frame):
+    news_x = None
+    phase = None
+    ball = None
+    if channel == 0:
+        news_x = 42 - (frame % 50)
+    elif channel == 1:
+        phase = frame % 20 < 10
+    elif channel == 2:
+        ball_x = 25 + 15 * math.cos(frame * 0.2)
+        ball_y = 20 + 8 * math.sin(frame * 0.3)
+        ball = (ball_x-3, ball_y-3, ball_x+3, ball_y+3)
+    return news_x, phase, ball
+
+
+def tv_sprite_index(channel, frame):
+    if channel == 0:
+        return frame % 50
+    if channel == 1:
+        return 50 + (frame % 20 < 10)
+    return 52 + frame
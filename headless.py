@@ -0,0 +1,284 @@
+import heapq
+import itertools
+import os
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+
+class HeadlessVar:
+    def __init__(self, master=None, value=""):
+        self.value = value
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class HeadlessWidget:
+    def __init__(self, master=None, **options):
+        self.master = master
+        self.options = dict(options)
+        self.bindings = {}
+
+    def configure(self, cnf=None, **options):
+        if cnf:
+            options.update(cnf)
+        self.options.update(options)
+
+    config = configure
+
+    def cget(self, key):
+        return self.options.get(key, "")
+
+    def bind(self, sequence, func=None, add=None):
+        self.bindings.setdefault(sequence, []).append(func)
+
+    def event_generate(self, sequence, **kw):
+        for func in self.bindings.get(sequence, []):
+            func(SimpleNamespace(widget=self, **kw))
+
+    def invoke(self):
+        command = self.options.get("command")
+        if command is not None:
+            return command()
+
+    def _noop(self, *args, **kwargs):
+        pass
+
+    def winfo_ismapped(self):
+        return True
+
+    pack = grid = place = _noop
+    pack_forget = grid_forget = grid_remove = place_forget = _noop
+    columnconfigure = rowconfigure = _noop
+    destroy = _noop
+
+
+class HeadlessScrollbar(HeadlessWidget):
+    def __init__(self, master=None, **options):
+        super().__init__(master, **options)
+        self.fraction = (0.0, 1.0)
+
+    def set(self, first, last):
+        self.fraction = (float(first), float(last))
+
+    def get(self):
+        return self.fraction
+
+
+class NullCanvas(HeadlessWidget):
+    def __init__(self, master=None, **options):
+        super().__init__(master, **options)
+        self.next_id = itertools.count(1)
+        self.calls = Counter()
+        self.items_created = 0
+        self.live_items = 0
+
+    def _create(self, kind, args, options):
+        self.calls["create_" + kind] += 1
+        self.items_created += 1
+        self.live_items += 1
+        return next(self.next_id)
+
+    def create_oval(self, *args, **options):
+        return self._create("oval", args, options)
+
+    def create_line(self, *args, **options):
+        return self._create("line", args, options)
+
+    def create_rectangle(self, *args, **options):
+        return self._create("rectangle", args, options)
+
+    def create_polygon(self, *args, **options):
+        return self._create("polygon", args, options)
+
+    def create_arc(self, *args, **options):
+        return self._create("arc", args, options)
+
+    def create_text(self, *args, **options):
+        return self._create("text", args, options)
+
+    def create_image(self, *args, **options):
+        return self._create("image", args, options)
+
+    def coords(self, item, *args):
+        self.calls["coords"] += 1
+
+    def itemconfigure(self, item, cnf=None, **options):
+        self.calls["itemconfigure"] += 1
+
+    itemconfig = itemconfigure
+
+    def delete(self, *items):
+        self.calls["delete"] += 1
+        if "all" in items:
+            self.live_items = 0
+
+    def find_all(self):
+        return tuple(range(1, self.live_items + 1))
+
+    def winfo_width(self):
+        return self.options.get("width", 0)
+
+    def winfo_height(self):
+        return self.options.get("height", 0)
+
+    def reset_counters(self):
+        self.calls.clear()
+        self.items_created = 0
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+
+class RecordingCanvas(NullCanvas):
+    def __init__(self, master=None, **options):
+        super().__init__(master, **options)
+        self.items = {}
+
+    def _create(self, kind, args, options):
+        item = super()._create(kind, args, options)
+        tags = options.pop("tags", ())
+        if isinstance(tags, str):
+            tags = tuple(tags.split())
+        self.items[item] = {
+            "type": kind,
+            "coords": tuple(args),
+            "options": options,
+            "tags": set(tags),
+        }
+        return item
+
+    def find_all(self):
+        return tuple(self.items)
+
+    def find_withtag(self, tag_or_id):
+        if isinstance(tag_or_id, int):
+            return (tag_or_id,) if tag_or_id in self.items else ()
+        if tag_or_id == "all":
+            return tuple(self.items)
+        wanted = {tag.strip() for tag in tag_or_id.split("||")}
+        return tuple(
+            item for item, record in self.items.items() if record["tags"] & wanted
+        )
+
+    def coords(self, item, *args):
+        super().coords(item, *args)
+        if not args:
+            return list(self.items[item]["coords"])
+        for found in self.find_withtag(item):
+            self.items[found]["coords"] = tuple(args)
+
+    def itemconfigure(self, item, cnf=None, **options):
+        super().itemconfigure(item, cnf, **options)
+        if cnf:
+            options.update(cnf)
+        for found in self.find_withtag(item):
+            self.items[found]["options"].update(options)
+
+    itemconfig = itemconfigure
+
+    def itemcget(self, item, option):
+        return self.items[item]["options"].get(option, "")
+
+    def delete(self, *items):
+        super().delete(*items)
+        for item in items:
+            for found in self.find_withtag(item):
+                del self.items[found]
+        self.live_items = len(self.items)
+
+
+class HeadlessPhotoImage:
+    tk = SimpleNamespace(call=lambda *args: None)
+    names = itertools.count(1)
+
+    def __init__(self, name=None, cnf=None, master=None, **options):
+        if "file" in options and not os.path.exists(options["file"]):
+            raise FileNotFoundError(options["file"])
+        self.name = name or f"image{next(self.names)}"
+        self.options = options
+
+    def width(self):
+        return self.options.get("width", 0)
+
+    def height(self):
+        return self.options.get("height", 0)
+
+    def __str__(self):
+        return self.name
+
+
+class HeadlessRoot(HeadlessWidget):
+    def __init__(self):
+        super().__init__()
+        self.now = 0.0
+        self.queue = []
+        self.cancelled = set()
+        self.sequence = itertools.count()
+        self.callbacks_run = 0
+        self.focus = self
+
+    def monotonic(self):
+        return self.now
+
+    def after(self, ms, func=None, *args):
+        sequence = next(self.sequence)
+        after_id = f"after#{sequence}"
+        heapq.heappush(self.queue, (self.now + ms / 1000, sequence, after_id, func, args))
+        return after_id
+
+    def after_idle(self, func, *args):
+        return self.after(0, func, *args)
+
+    def after_cancel(self, after_id):
+        self.cancelled.add(after_id)
+
+    def advance(self, ms):
+        deadline = self.now + ms / 1000
+        while self.queue and self.queue[0][0] <= deadline:
+            due, _sequence, after_id, func, args = heapq.heappop(self.queue)
+            if after_id in self.cancelled:
+                self.cancelled.discard(after_id)
+                continue
+            self.now = max(self.now, due)
+            self.callbacks_run += 1
+            func(*args)
+        self.now = deadline
+
+    def run_realtime(self, seconds, until=None, idle_sleep=0.001):
+        start = time.monotonic()
+        origin = self.now
+        while time.monotonic() - start < seconds and not (until and until()):
+            self.advance((origin + time.monotonic() - start - self.now) * 1000)
+            time.sleep(idle_sleep)
+
+    def focus_get(self):
+        return self.focus
+
+    def update(self):
+        self.advance(0)
+
+    update_idletasks = update
+
+    def _noop(self, *args, **kwargs):
+        pass
+
+    title = geometry = protocol = mainloop = _noop
+
+
+class HeadlessBackend:
+    def __init__(self, canvas=RecordingCanvas, images=False):
+        widgets = {
+            "Label": HeadlessWidget,
+            "Button": HeadlessWidget,
+            "Frame": HeadlessWidget,
+            "LabelFrame": HeadlessWidget,
+        }
+        self.tk = SimpleNamespace(Canvas=canvas, StringVar=HeadlessVar, **widgets)
+        if images:
+            self.tk.PhotoImage = HeadlessPhotoImage
+        self.ttk = SimpleNamespace(Scrollbar=HeadlessScrollbar, **widgets)
@@ -1,57 +1,845 @@
 import tkinter as tk
 from tkinter import ttk
 import json
-from datetime import datetime
-import colorsys
+from array import array
+from collections import OrderedDict
 import math
-import random
+import os
+import time
+
+from devices import DeviceRegistry
+from frames import BRIGHTNESS_STEPS, fan_frame, light_frame, tv_frame, tv_sprite_index
+from journal import Journal
+from persistence import StateWriter, write_json_atomic, write_text_atomic
+from scheduler import Scheduler
+from statestore import STORE_FILE, StateStore
+
+FRAME_MS = 10
+STATE_FILE = "appliance_states.json"
+SAVE_DELAY = 0.5
+JOURNAL_DIR = "appliance_journal"
+JOURNAL_FLUSH_MS = 1000
+
+AC_PARTICLE_POOL = 32
+SPEAKER_WAVE_POOL = 24
+HIDDEN_COORDS = (-10, -10, -10, -10)
+FRAME_CACHE_SIZE = 1024
+VISIBLE_ROWS = 3
+UNFOCUSED_THROTTLE = 4
+FRAME_BUDGET_MS = 8.0
+MAX_SLOWDOWN = 8
+METRICS_OVERLAY_MS = 500
+METRICS_EXPORT_MS = 10000
+STARTUP_STAGGER_MS = 2 * FRAME_MS
+SIMULATION_MS = 1000
+SPRITE_POLL_MS = 100
+MAX_CATCH_UP_STEPS = MAX_SLOWDOWN * UNFOCUSED_THROTTLE
+
+
+class ClockSubscriber:
+    __slots__ = ("callback", "divisor", "countdown", "waited", "priority")
+
+    def __init__(self, callback, divisor, waited, priority):
+        self.callback = callback
+        self.divisor = divisor
+        self.countdown = divisor + waited
+        self.waited = -waited
+        self.priority = priority
+
+
+class FrameGovernor:
+    def __init__(self, budget_ms=FRAME_BUDGET_MS, max_slowdown=MAX_SLOWDOWN, smoothing=0.2, cooldown=10):
+        self.budget_ms = budget_ms
+        self.max_slowdown = max_slowdown
+        self.smoothing = smoothing
+        self.cooldown = cooldown
+        self.average_ms = 0.0
+        self.slowdown = {}
+        self.wait = 0
+
+    def factor(self, priority):
+        return self.slowdown.get(priority, 1)
+
+    def record(self, cost_ms, priorities):
+        self.average_ms += self.smoothing * (cost_ms - self.average_ms)
+        if self.wait > 0:
+            self.wait -= 1
+            return
+        if self.average_ms > self.budget_ms:
+            changed = self.shed(priorities)
+        elif self.average_ms < self.budget_ms / 2:
+            changed = self.restore()
+        else:
+            changed = False
+        if changed:
+            self.wait = self.cooldown
+
+    def shed(self, priorities):
+        for priority in sorted(priorities):
+            factor = self.factor(priority)
+            if factor < self.max_slowdown:
+                self.slowdown[priority] = factor * 2
+                return True
+        return False
+
+    def restore(self):
+        for priority in sorted(self.slowdown, reverse=True):
+            factor = self.slowdown[priority] // 2
+            if factor > 1:
+                self.slowdown[priority] = factor
+            else:
+                del self.slowdown[priority]
+            return True
+        return False
+
+
+class AnimationClock:
+    def __init__(self, root, frame_ms=FRAME_MS, governor=None):
+        self.root = root
+        self.frame_ms = frame_ms
+        self.governor = governor
+        self.subscribers = {}
+        self.timer = getattr(root, "monotonic", time.monotonic)
+        self.after_id = None
+        self.armed_step = 0
+        self.last_tick = None
+        self.paused = False
+        self.throttle = 1
+        self.last_cost_ms = 0.0
+        self.metrics = None
+        self.armed_at = None
+        self.armed_delay = 0
+
+    def register(self, key, callback, divisor=1, priority=0):
+        subscriber = ClockSubscriber(callback, divisor, self.frames_waited(), priority)
+        self.subscribers[key] = subscriber
+        if subscriber.countdown < self.armed_step:
+            self.cancel()
+        self.schedule()
+
+    def unregister(self, key):
+        if self.subscribers.pop(key, None) is None:
+            return False
+        if not self.subscribers:
+            self.cancel()
+            self.last_tick = None
+        return True
+
+    def cancel(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def pause(self):
+        if self.paused:
+            return
+        self.paused = True
+        self.cancel()
+
+    def resume(self):
+        if not self.paused:
+            return
+        self.paused = False
+        self.last_tick = self.timer()
+        self.schedule()
+
+    def set_throttle(self, throttle):
+        throttle = max(1, throttle)
+        if throttle == self.throttle:
+            return
+        self.throttle = throttle
+        self.cancel()
+        self.schedule()
+
+    def is_registered(self, key):
+        return key in self.subscribers
+
+    def frames_waited(self):
+        if self.last_tick is None or self.paused:
+            return 0
+        return round((self.timer() - self.last_tick) * 1000 / self.frame_ms)
+
+    def next_due(self):
+        return min(subscriber.countdown for subscriber in self.subscribers.values())
+
+    def schedule(self):
+        if self.after_id is not None or self.paused or not self.subscribers:
+            return
+        if self.last_tick is None:
+            self.last_tick = self.timer()
+        self.armed_step = self.next_due()
+        waited_ms = (self.timer() - self.last_tick) * 1000
+        delay = max(
+            math.ceil(self.frame_ms * self.armed_step * self.throttle - waited_ms),
+            math.ceil(self.last_cost_ms),
+            1,
+        )
+        self.after_id = self.root.after(delay, self.tick)
+        if self.metrics is not None:
+            self.armed_at = self.timer()
+            self.armed_delay = delay
+
+    def tick(self):
+        self.after_id = None
+        now = self.timer()
+        metrics = self.metrics
+        if metrics is not None and self.armed_at is not None:
+            metrics.observe_jitter((now - self.armed_at) * 1000 - self.armed_delay)
+        frames = max(self.armed_step, round((now - self.last_tick) * 1000 / self.frame_ms))
+        self.last_tick = now
+
+        governor = self.governor
+        started = time.perf_counter()
+        for key, subscriber in list(self.subscribers.items()):
+            if self.subscribers.get(key) is not subscriber:
+                continue
+            subscriber.countdown -= frames
+            subscriber.waited += frames
+            if subscriber.countdown > 0:
+                continue
+            subscriber.countdown = subscriber.divisor
+            if governor is not None:
+                subscriber.countdown *= governor.factor(subscriber.priority)
+            steps = max(1, subscriber.waited // subscriber.divisor)
+            subscriber.waited = max(0, subscriber.waited - steps * subscriber.divisor)
+            subscriber.callback(min(steps, MAX_CATCH_UP_STEPS))
+        self.last_cost_ms = (time.perf_counter() - started) * 1000
+        if metrics is not None:
+            metrics.observe_tick(self.last_cost_ms)
+
+        if governor is not None:
+            governor.record(
+                self.last_cost_ms,
+                {subscriber.priority for subscriber in self.subscribers.values()},
+            )
+        self.schedule()
+
+
+class FrameCache:
+    def __init__(self, max_entries=FRAME_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            value = build(*key[1:])
+            self.entries[key] = value
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return value
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.entries),
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def hex_to_rgb(hex_color):
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+
+def rgb_to_hex(r, g, b):
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+class ApplianceAnimation:
+    __slots__ = ("canvas", "button", "cache", "items", "sprites")
+    divisor = 10
+    priority = 2
+    canvas_size = (40, 40)
+
+    def __init__(self):
+        self.canvas = None
+        self.button = None
+        self.cache = None
+        self.items = None
+        self.sprites = None
+
+    def start(self, canvas, button, cache):
+        self.canvas = canvas
+        self.button = button
+        self.cache = cache
+        self.items = None
+
+    def stop(self):
+        if self.canvas is not None:
+            self.canvas.delete("all")
+        self.canvas = None
+        self.button = None
+        self.items = None
+
+    def get_items(self):
+        if self.items is None:
+            self.items = self.build(self.canvas)
+        return self.items
+
+    def build(self, canvas):
+        return {}
+
+    def build_sprite(self, canvas):
+        return {"image": canvas.create_image(0, 0, anchor=tk.NW, tags="sprite"), "sprite": None}
+
+    def show_sprite(self, index):
+        items = self.get_items()
+        if items["sprite"] != index:
+            self.canvas.itemconfigure(items["image"], image=self.sprites[index])
+            items["sprite"] = index
+
+    def tick(self, steps=1):
+        pass
+
+
+class ButtonPulseAnimation(ApplianceAnimation):
+    __slots__ = ("direction",)
+
+    def __init__(self):
+        super().__init__()
+        self.direction = 1
+
+    def start(self, canvas, button, cache):
+        super().start(canvas, button, cache)
+        self.direction = 1
+
+    def tick(self, steps=1):
+        import colorsys
+        current_color = self.button.cget("bg")
+        r, g, b = hex_to_rgb(current_color)
+        
+        h, s, v = colorsys.rgb_to_hsv(r/255, g/255, b/255)
+        
+        for _ in range(steps):
+            v += self.direction * 0.02
+            
+            if v >= 1.0:
+                v = 1.0
+                self.direction = -1
+            elif v <= 0.7:
+                v = 0.7
+                self.direction = 1
+            
+        r, g, b = colorsys.hsv_to_rgb(h, s, v)
+        self.button.configure(bg=rgb_to_hex(int(r*255), int(g*255), int(b*255)))
+
+
+class FanAnimation(ApplianceAnimation):
+    __slots__ = ("angle",)
+    divisor = 5
+    priority = 4
+
+    def __init__(self):
+        super().__init__()
+        self.angle = 0
+
+    def build(self, canvas):
+        if self.sprites is not None:
+            return self.build_sprite(canvas)
+        canvas.create_oval(15, 15, 25, 25, fill="#333333", outline="#333333", tags="static")
+        blades = [
+            canvas.create_line(0, 0, 0, 0, 0, 0, width=3, fill="#333333", tags="blade")
+            for _ in range(4)
+        ]
+        return {"blades": blades}
+
+    def draw(self):
+        if self.sprites is not None:
+            self.show_sprite(self.angle // 10)
+            return
+        items = self.get_items()
+        blades = self.cache.get(("fan", self.angle), fan_frame)
+        
+        for blade, points in zip(items["blades"], blades):
+            self.canvas.coords(blade, *points)
+
+    def tick(self, steps=1):
+        self.angle = (self.angle + 10 * steps) % 360
+        self.draw()
+
+
+class LightBulbAnimation(ApplianceAnimation):
+    __slots__ = ("brightness", "direction")
+    priority = 3
+
+    def __init__(self):
+        super().__init__()
+        self.brightness = 0.0
+        self.direction = 1
+
+    def start(self, canvas, button, cache):
+        super().start(canvas, button, cache)
+        self.direction = 1
+
+    def build(self, canvas):
+        if self.sprites is not None:
+            return self.build_sprite(canvas)
+        glow = canvas.create_oval(5, 5, 25, 25, fill="", outline="", tags="glow")
+        bulb = canvas.create_oval(8, 8, 22, 22, fill="", outline="#333333", tags="bulb")
+        canvas.create_rectangle(12, 22, 18, 30, fill="#888888", outline="#333333", tags="static")
+        canvas.create_rectangle(10, 30, 20, 35, fill="#888888", outline="#333333", tags="static")
+        return {"glow": glow, "bulb": bulb}
+
+    def draw(self):
+        step = round(self.brightness * BRIGHTNESS_STEPS)
+        if self.sprites is not None:
+            self.show_sprite(step)
+            return
+        items = self.get_items()
+        
+        bulb_color, glow_color = self.cache.get(("light", step), light_frame)
+        
+        self.canvas.itemconfigure(items["glow"], fill=glow_color)
+        self.canvas.itemconfigure(items["bulb"], fill=bulb_color)
+
+    def tick(self, steps=1):
+        for _ in range(steps):
+            current = self.brightness + self.direction * 0.05
+            
+            if current >= 1.0:
+                current = 1.0
+                self.direction = -1
+            elif current <= 0.4:
+                self.direction = 1
+                
+            self.brightness = current
+        self.draw()
+
+
+class ParticlePool:
+    __slots__ = ("capacity", "count", "xs", "ys", "sizes")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.count = 0
+        self.xs = array("d", bytes(8 * capacity))
+        self.ys = array("d", bytes(8 * capacity))
+        self.sizes = array("d", bytes(8 * capacity))
+
+    def spawn(self, x, y, size):
+        if self.count >= self.capacity:
+            return False
+        slot = self.count
+        self.xs[slot] = x
+        self.ys[slot] = y
+        self.sizes[slot] = size
+        self.count += 1
+        return True
+
+    def advance(self, dx, limit):
+        xs, ys, sizes = self.xs, self.ys, self.sizes
+        slot = 0
+        count = self.count
+        while slot < count:
+            x = xs[slot] + dx
+            if x < limit:
+                xs[slot] = x
+                slot += 1
+                continue
+            count -= 1
+            xs[slot] = xs[count]
+            ys[slot] = ys[count]
+            sizes[slot] = sizes[count]
+        self.count = count
+
+
+class AirConditionerAnimation(ApplianceAnimation):
+    __slots__ = ("particles", "spawn_scale")
+    divisor = 7
+    priority = 0
+    canvas_size = (60, 30)
+
+    def __init__(self, particles=AC_PARTICLE_POOL):
+        super().__init__()
+        self.particles = ParticlePool(particles)
+        self.spawn_scale = max(1, particles // AC_PARTICLE_POOL)
+
+    def build(self, canvas):
+        canvas.create_rectangle(5, 5, 20, 25, fill="#cccccc", outline="#333333", tags="static")
+        
+        for y in range(8, 23, 5):
+            canvas.create_line(20, y, 25, y, fill="#333333", tags="static")
+        
+        pool = [
+            canvas.create_oval(*HIDDEN_COORDS, fill="#add8e6", outline="", tags="particle")
+            for _ in range(self.particles.capacity)
+        ]
+        return {"pool": pool, "visible": 0}
+
+    def tick(self, steps=1):
+        import random
+        canvas = self.canvas
+        items = self.get_items()
+        pool = items["pool"]
+        particles = self.particles
+        xs, ys, sizes = particles.xs, particles.ys, particles.sizes
+        
+        visible = particles.count
+        for slot in range(visible):
+            x, y, size = xs[slot], ys[slot], sizes[slot]
+            canvas.coords(pool[slot], x, y, x+size, y+size)
+        
+        for slot in range(visible, items["visible"]):
+            canvas.coords(pool[slot], *HIDDEN_COORDS)
+        items["visible"] = visible
+        
+        for _ in range(steps):
+            particles.advance(2, 60)
+                    
+            if random.random() < 0.3:
+                for _ in range(random.randint(1, 3) * self.spawn_scale):
+                    y = random.randint(5, 25)
+                    size = random.uniform(1, 3)
+                    particles.spawn(25, y, size)
+
+
+class TVAnimation(ApplianceAnimation):
+    __slots__ = ("channel", "frame")
+    canvas_size = (50, 40)
+
+    def __init__(self):
+        super().__init__()
+        self.channel = 0
+        self.frame = 0
+
+    def build(self, canvas):
+        if self.sprites is not None:
+            return self.build_sprite(canvas)
+        canvas.create_rectangle(5, 5, 45, 35, fill="#222222", outline="#000000", width=2, tags="static")
+        
+        canvas.create_rectangle(8, 8, 42, 15, fill="#ff0000", outline="", tags="channel0")
+        news = canvas.create_text(42, 12, text="NEWS", fill="white", font=("Arial", 6), tags="channel0")
+        canvas.create_rectangle(8, 16, 42, 32, fill="#dddddd", outline="", tags="channel0")
+        for i in range(3):
+            canvas.create_line(10, 20+i*4, 40, 20+i*4, fill="#555555", tags="channel0")
+        
+        backdrop = canvas.create_rectangle(8, 8, 42, 32, fill="#0000ff", outline="", tags="channel1")
+        sun = canvas.create_oval(15, 15, 25, 25, fill="#ffff00", outline="", tags="channel1")
+        block = canvas.create_rectangle(25, 15, 35, 25, fill="#ff0000", outline="", tags="channel1")
+        
+        canvas.create_rectangle(8, 8, 42, 32, fill="#00aa00", outline="", tags="channel2")
+        ball = canvas.create_oval(0, 0, 0, 0, fill="white", outline="", tags="channel2")
+        
+        canvas.create_rectangle(20, 35, 30, 38, fill="#444444", outline="#000000", tags="static")
+        
+        canvas.itemconfigure("channel0 || channel1 || channel2", state=tk.HIDDEN)
+        return {
+            "news": news,
+            "backdrop": backdrop,
+            "sun": sun,
+            "block": block,
+            "ball": ball,
+            "channel": None,
+            "phase": None,
+        }
+
+    def draw(self):
+        if self.sprites is not None:
+            self.show_sprite(tv_sprite_index(self.channel, self.frame))
+            return
+        canvas = self.canvas
+        items = self.get_items()
+        
+        channel = self.channel
+        news_x, phase, ball = self.cache.get(("tv", channel, self.frame), tv_frame)
+        
+        if items["channel"] != channel:
+            if items["channel"] is not None:
+                canvas.itemconfigure(f"channel{items['channel']}", state=tk.HIDDEN)
+            canvas.itemconfigure(f"channel{channel}", state=tk.NORMAL)
+            items["channel"] = channel
+            items["phase"] = None
+        
+        if channel == 0:
+            canvas.coords(items["news"], news_x, 12)
+        
+        elif channel == 1:
+            if items["phase"] != phase:
+                if phase:
+                    canvas.itemconfigure(items["backdrop"], fill="#0000ff")
+                    canvas.itemconfigure(items["sun"], state=tk.NORMAL)
+                    canvas.itemconfigure(items["block"], state=tk.HIDDEN)
+                else:
+                    canvas.itemconfigure(items["backdrop"], fill="#008800")
+                    canvas.itemconfigure(items["sun"], state=tk.HIDDEN)
+                    canvas.itemconfigure(items["block"], state=tk.NORMAL)
+                items["phase"] = phase
+        
+        elif channel == 2:
+            canvas.coords(items["ball"], *ball)
+
+    def tick(self, steps=1):
+        import random
+        for _ in range(steps):
+            self.frame = (self.frame + 1) % 100
+            
+            if self.frame == 0 and random.random() < 0.3:
+                self.channel = (self.channel + 1) % 3
+        
+        self.draw()
+
+
+class SpeakerAnimation(ApplianceAnimation):
+    __slots__ = ("waves",)
+    priority = 1
+
+    def __init__(self):
+        super().__init__()
+        self.waves = []
+
+    def build(self, canvas):
+        canvas.create_rectangle(5, 10, 15, 30, fill="#333333", outline="#222222", tags="static")
+        
+        canvas.create_oval(8, 15, 12, 25, fill="#666666", outline="#444444", tags="static")
+        
+        pool = [
+            canvas.create_arc(
+                *HIDDEN_COORDS,
+                start=270, extent=180, style="arc", outline="#333333", width=2, tags="wave"
+            )
+            for _ in range(SPEAKER_WAVE_POOL)
+        ]
+        return {"pool": pool, "visible": 0}
+
+    def tick(self, steps=1):
+        import random
+        canvas = self.canvas
+        items = self.get_items()
+        pool = items["pool"]
+        waves = self.waves
+        
+        for slot, radius in enumerate(waves[:len(pool)]):
+            x = 10 + radius
+            canvas.coords(pool[slot], x-radius, 20-radius, x+radius, 20+radius)
+        
+        visible = min(len(waves), len(pool))
+        for slot in range(visible, items["visible"]):
+            canvas.coords(pool[slot], *HIDDEN_COORDS)
+        items["visible"] = visible
+        
+        for _ in range(steps):
+            waves = [r+1 for r in waves if r < 25]
+            
+            if random.random() < 0.2 or not waves:
+                waves.append(3)
+                
+        self.waves = waves
+
+
+class RadioAnimation(ApplianceAnimation):
+    __slots__ = ("bars",)
+    divisor = 20
+    priority = 0
+
+    def __init__(self):
+        super().__init__()
+        self.bars = []
+
+    def build(self, canvas):
+        canvas.create_rectangle(5, 10, 35, 30, fill="#884400", outline="#663300", width=2, tags="static")
+        
+        canvas.create_oval(10, 15, 18, 23, fill="#cccccc", outline="#333333", tags="static")
+        canvas.create_line(14, 19, 17, 19, fill="#333333", width=1, tags="static")
+        
+        canvas.create_rectangle(20, 13, 32, 27, fill="#222222", outline="#111111", tags="static")
+        
+        bars = [
+            canvas.create_rectangle(0, 0, 0, 0, fill="#00ff00", outline="", tags="bar")
+            for _ in range(5)
+        ]
+        return {"bars": bars}
+
+    def tick(self, steps=1):
+        import random
+        canvas = self.canvas
+        items = self.get_items()
+        
+        bars = self.bars
+        if not bars:
+            bars = [0, 0, 0, 0, 0]
+        
+        bar_width = 2
+        for i, height in enumerate(bars):
+            x = 21 + i * (bar_width + 1)
+            canvas.coords(items["bars"][i], x, 26-height, x+bar_width, 26)
+        
+        for _step in range(steps):
+            updated_bars = []
+            for _ in range(5):
+                if random.random() < 0.7:
+                    height = random.randint(2, 12)
+                else:
+                    height = bars[_] if _ < len(bars) else random.randint(2, 12)
+                updated_bars.append(height)
+            bars = updated_bars
+            
+        self.bars = bars
+
+
+ANIMATIONS = {
+    "light": LightBulbAnimation,
+    "fan": FanAnimation,
+    "ac": AirConditionerAnimation,
+    "tv": TVAnimation,
+    "speaker": SpeakerAnimation,
+    "radio": RadioAnimation,
+    "pulse": ButtonPulseAnimation,
+}
+
+
+class DeviceRow:
+    __slots__ = ("frame", "label", "button", "canvas", "device_id")
+
+    def __init__(self, frame, label, button, canvas):
+        self.frame = frame
+        self.label = label
+        self.button = button
+        self.canvas = canvas
+        self.device_id = None
+
+
+class VirtualDeviceList:
+    def __init__(self, app, parent, devices, visible_rows=VISIBLE_ROWS):
+        self.app = app
+        self.devices = devices
+        self.first = 0
+        self.rows = [
+            app.create_control_widget(parent, i, device)
+            for i, device in enumerate(devices[:visible_rows])
+        ]
+        self.scrollbar = None
+        
+        if len(devices) > len(self.rows):
+            self.scrollbar = app.backend.ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.on_scroll)
+            self.scrollbar.grid(row=0, column=1, rowspan=len(self.rows), sticky="ns")
+            for row in self.rows:
+                for widget in (row.frame, row.label, row.button, row.canvas):
+                    widget.bind("<MouseWheel>", self.on_wheel)
+                    widget.bind("<Button-4>", self.on_wheel)
+                    widget.bind("<Button-5>", self.on_wheel)
+        
+        self.refresh()
+
+    def visible_devices(self):
+        return self.devices[self.first:self.first + len(self.rows)]
+
+    def refresh(self):
+        visible = self.visible_devices()
+        incoming = {device.id for device in visible}
+        for row, device in zip(self.rows, visible):
+            if row.device_id is not None and row.device_id != device.id:
+                self.app.unbind_row(row, keep=row.device_id in incoming)
+        for row, device in zip(self.rows, visible):
+            self.app.bind_row(row, device)
+        
+        if self.scrollbar is not None:
+            count = len(self.devices)
+            self.scrollbar.set(self.first / count, (self.first + len(self.rows)) / count)
+
+    def scroll_to(self, first):
+        first = max(0, min(first, len(self.devices) - len(self.rows)))
+        if first != self.first:
+            self.first = first
+            self.refresh()
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == tk.MOVETO:
+            self.scroll_to(round(float(amount) * len(self.devices)))
+        elif action == tk.SCROLL:
+            step = int(amount) * (len(self.rows) if unit == tk.PAGES else 1)
+            self.scroll_to(self.first + step)
+
+    def on_wheel(self, event):
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            self.scroll_to(self.first - 1)
+        else:
+            self.scroll_to(self.first + 1)
+        return "break"
+
+
+class TkBackend:
+    tk = tk
+    ttk = ttk
+
 
 class HomeApplianceControl:
-    def __init__(self, root):
+    def __init__(self, root, backend=None, registry=None, save_delay=SAVE_DELAY, use_sprites=True,
+                 gateway=None):
         self.root = root
+        self.backend = backend or TkBackend()
+        self.registry = registry or DeviceRegistry.load()
+        self.state_writer = StateWriter(STATE_FILE, quiet_period=save_delay)
+        self.journal = Journal(JOURNAL_DIR)
+        self.journal_flush_id = None
+        self.control_server = None
+        self.device_link = None
+        self.metrics = None
+        self.metrics_label = None
+        self.metrics_shown = False
+        self.metrics_overlay_id = None
+        self.metrics_path = None
+        self.simulation = None
+        self.simulation_speed = 1.0
+        self.use_sprites = use_sprites
+        self.sprites = {}
+        self.sprite_build = None
         self.root.title("Home Appliance Control System")
         self.root.geometry("800x600")
         self.root.configure(bg="#f0f0f0")
         
         self.bg_color = "#f0f0f0"
 
-        self.appliance_states = {
-            "Living Room Light": False,
-            "Bedroom Light": False,
-            "Kitchen Light": False,
-            "Living Room Fan": False,
-            "Bedroom Fan": False,
-            "Air Conditioner": False,
-            "TV": False,
-            "Speaker": False,
-            "Radio": False
-        }
+        self.appliance_states = {device.id: False for device in self.registry}
+        self.status_var = self.backend.tk.StringVar()
+        self.status_var.set("System Ready")
 
         self.on_color = "#4CAF50"
         self.off_color = "#f0f0f0"
         
         self.buttons = {}
         
-        self.animations = {}
+        self.clock = AnimationClock(root, governor=FrameGovernor())
         
         self.animation_canvases = {}
-        self.animation_angles = {}
-        
-        self.ac_particles = {}
-        
-        self.bulb_brightness = {}
-        
-        self.tv_state = {"channel": 0, "frame": 0}
-        
-        self.speaker_waves = {}
-        
-        self.radio_bars = {}
+        self.device_lists = {}
+        self.frame_cache = FrameCache()
+        self.animations = {}
+        self.pending_starts = []
         
-        self.create_widgets()
         self.load_states()
+        self.state_store = StateStore(STORE_FILE, list(self.appliance_states), self.appliance_states)
+        self.state_store.write_all(self.appliance_states)
+        self.scheduler = Scheduler(root, self.registry, self.apply_states)
+        self.load_schedules()
+        self.create_widgets()
+        self.scheduler.arm()
+        if self.registry.gateways or gateway:
+            self.start_device_link(gateway)
+        self.root.after_idle(self.root.after, STARTUP_STAGGER_MS, self.start_animations)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.bind("<Unmap>", self.on_unmap, add="+")
+        self.root.bind("<Map>", self.on_map, add="+")
+        self.root.bind("<Visibility>", self.on_visibility, add="+")
+        self.root.bind("<FocusIn>", self.on_focus_in, add="+")
+        self.root.bind("<FocusOut>", self.on_focus_out, add="+")
 
     def create_widgets(self):
-        title_label = tk.Label(
+        title_label = self.backend.tk.Label(
             self.root,
             text="Home Appliance Control Panel",
             font=("Helvetica", 24, "bold"),
@@ -60,482 +848,525 @@ class HomeApplianceControl:
         )
         title_label.pack(pady=20)
 
-        main_frame = ttk.Frame(self.root)
+        main_frame = self.backend.ttk.Frame(self.root)
         main_frame.pack(padx=20, pady=20, fill="both", expand=True)
         
         main_frame.columnconfigure(0, weight=1)
         main_frame.columnconfigure(1, weight=1)
-        main_frame.rowconfigure(0, weight=1)
-        main_frame.rowconfigure(1, weight=1)
+        
+        sections = list(self.registry.sections.values())
+        for row in range((len(sections) + 1) // 2):
+            main_frame.rowconfigure(row, weight=1)
 
-        self.create_lighting_section(main_frame)
-        self.create_climate_section(main_frame)
-        self.create_entertainment_section(main_frame)
+        for i, section in enumerate(sections):
+            self.create_section(main_frame, section, i, len(sections))
         
-        control_frame = ttk.Frame(self.root)
+        control_frame = self.backend.ttk.Frame(self.root)
         control_frame.pack(padx=20, pady=10, fill="x")
         
-        save_btn = ttk.Button(
+        save_btn = self.backend.ttk.Button(
             control_frame, 
             text="Save Configuration",
             command=self.save_states
         )
         save_btn.pack(side=tk.RIGHT, padx=5)
         
-        self.status_var = tk.StringVar()
-        self.status_var.set("System Ready")
-        status_bar = ttk.Label(
-            self.root,
+        for scene in self.registry.scenes.values():
+            scene_btn = self.backend.ttk.Button(
+                control_frame,
+                text=scene.name,
+                command=lambda s=scene.id: self.apply_scene(s)
+            )
+            scene_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.status_frame = self.backend.ttk.Frame(self.root)
+        self.status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        status_bar = self.backend.ttk.Label(
+            self.status_frame,
             textvariable=self.status_var,
             relief=tk.SUNKEN,
             anchor=tk.W
         )
-        status_bar.pack(side=tk.BOTTOM, fill=tk.X)
-
-    def create_lighting_section(self, parent):
-        light_frame = ttk.LabelFrame(parent, text="Lighting Control", padding=10)
-        light_frame.grid(row=0, column=0, padx=10, pady=5, sticky="nsew")
-
-        lights = ["Living Room Light", "Bedroom Light", "Kitchen Light"]
-        for i, light in enumerate(lights):
-            self.create_control_widget(light_frame, light, i)
+        status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
-    def create_climate_section(self, parent):
-        climate_frame = ttk.LabelFrame(parent, text="Climate Control", padding=10)
-        climate_frame.grid(row=0, column=1, padx=10, pady=5, sticky="nsew")
+    def create_section(self, parent, section, index, count):
+        section_frame = self.backend.ttk.LabelFrame(parent, text=section.title, padding=10)
+        row, column = divmod(index, 2)
+        columnspan = 2 if column == 0 and index == count - 1 else 1
+        section_frame.grid(row=row, column=column, columnspan=columnspan, padx=10, pady=5, sticky="nsew")
 
-        climate_devices = ["Living Room Fan", "Bedroom Fan", "Air Conditioner"]
-        for i, device in enumerate(climate_devices):
-            self.create_control_widget(climate_frame, device, i)
+        self.device_lists[section.id] = VirtualDeviceList(self, section_frame, section.devices)
 
-    def create_entertainment_section(self, parent):
-        entertainment_frame = ttk.LabelFrame(parent, text="Entertainment", padding=10)
-        entertainment_frame.grid(row=1, column=0, columnspan=2, padx=10, pady=5, sticky="nsew")
-
-        entertainment_devices = ["TV", "Speaker", "Radio"]
-        for i, device in enumerate(entertainment_devices):
-            self.create_control_widget(entertainment_frame, device, i)
-
-    def create_control_widget(self, parent, appliance, row):
-        frame = ttk.Frame(parent)
+    def create_control_widget(self, parent, row, device):
+        frame = self.backend.ttk.Frame(parent)
         frame.grid(row=row, column=0, padx=5, pady=5, sticky="ew")
         
-        label = ttk.Label(frame, text=f"{appliance}:")
+        label = self.backend.ttk.Label(frame, text=f"{device.name}:")
         label.pack(side=tk.LEFT, padx=5)
         
-        button_text = "ON" if self.appliance_states[appliance] else "OFF"
-        button_bg = self.on_color if self.appliance_states[appliance] else self.off_color
-        
-        button = tk.Button(
+        state = self.appliance_states[device.id]
+        button = self.backend.tk.Button(
             frame,
-            text=button_text,
-            bg=button_bg,
+            text="ON" if state else "OFF",
+            bg=self.on_color if state else self.off_color,
             width=8,
             relief=tk.RAISED
         )
-        
-        self.buttons[appliance] = button
-        
-        button.config(command=lambda a=appliance: self.toggle_appliance(a))
         button.pack(side=tk.LEFT, padx=5)
         
-        canvas_width = 40
-        canvas_height = 40
-        
-        if appliance == "Air Conditioner":
-            canvas_width = 60
-            canvas_height = 30
-        elif appliance == "TV":
-            canvas_width = 50
-            canvas_height = 40
-        
-        canvas = tk.Canvas(
+        canvas_width, canvas_height = self.animation_class(device).canvas_size
+        canvas = self.backend.tk.Canvas(
             frame, 
-            width=canvas_width, 
-            height=canvas_height, 
+            width=canvas_width,
+            height=canvas_height,
             bg=self.bg_color, 
             highlightthickness=0
         )
         canvas.pack(side=tk.LEFT, padx=5)
         
-        self.animation_canvases[appliance] = canvas
-        
-        if "Fan" in appliance:
-            self.animation_angles[appliance] = 0
-        elif "Light" in appliance:
-            self.bulb_brightness[appliance] = 0.0
-        elif appliance == "Air Conditioner":
-            self.ac_particles[appliance] = []
-        elif appliance == "Speaker":
-            self.speaker_waves[appliance] = []
-        elif appliance == "Radio":
-            self.radio_bars[appliance] = []
-        elif appliance == "TV":
-            pass
-        
-        if self.appliance_states[appliance]:
-            self.start_animation(appliance)
-
-    def toggle_appliance(self, appliance):
-        self.appliance_states[appliance] = not self.appliance_states[appliance]
-        state = "ON" if self.appliance_states[appliance] else "OFF"
-        color = self.on_color if self.appliance_states[appliance] else self.off_color
-        
-        self.buttons[appliance].configure(text=state, bg=color)
-        self.update_status(f"{appliance} turned {state}")
-        
-        if self.appliance_states[appliance]:
-            self.start_animation(appliance)
-        else:
-            self.stop_animation(appliance)
-            
-        self.save_states()
-    
-    def start_animation(self, appliance):
-        self.stop_animation(appliance)
-        
-        if "Fan" in appliance:
-            self.animate_fan(appliance)
-        elif "Light" in appliance:
-            self.animate_light_bulb(appliance, 1)
-        elif appliance == "Air Conditioner":
-            self.animate_ac_wind(appliance)
-        elif appliance == "TV":
-            self.animate_tv(appliance)
-        elif appliance == "Speaker":
-            self.animate_speaker(appliance)
-        elif appliance == "Radio":
-            self.animate_radio(appliance)
-        else:
-            self.animate_button(appliance, 1, 0)
-    
-    def stop_animation(self, appliance):
-        if appliance in self.animations:
-            self.root.after_cancel(self.animations[appliance])
-            del self.animations[appliance]
-            
-            if self.appliance_states[appliance]:
-                self.buttons[appliance].configure(bg=self.on_color)
-            
-            if appliance in self.animation_canvases:
-                self.animation_canvases[appliance].delete("all")
-    
-    def animate_button(self, appliance, direction, step):
-        if not self.appliance_states[appliance] or appliance not in self.buttons:
-            return
-        
-        current_color = self.buttons[appliance].cget("bg")
-        r, g, b = self.hex_to_rgb(current_color)
-        
-        h, s, v = colorsys.rgb_to_hsv(r/255, g/255, b/255)
-        
-        v += direction * 0.02
-        
-        if v >= 1.0:
-            v = 1.0
-            direction = -1
-        elif v <= 0.7:
-            v = 0.7
-            direction = 1
-            
-        r, g, b = colorsys.hsv_to_rgb(h, s, v)
-        hex_color = self.rgb_to_hex(int(r*255), int(g*255), int(b*255))
-        
-        self.buttons[appliance].configure(bg=hex_color)
-        
-        animation_id = self.root.after(100, lambda: self.animate_button(appliance, direction, step+1))
-        self.animations[appliance] = animation_id
-    
-    def draw_fan(self, appliance):
-        if appliance not in self.animation_canvases:
-            return
-            
-        canvas = self.animation_canvases[appliance]
-        canvas.delete("all")
-            
-        canvas.create_oval(15, 15, 25, 25, fill="#333333", outline="#333333")
-        
-        angle = self.animation_angles.get(appliance, 0)
-        
-        for i in range(4):
-            blade_angle = angle + (i * 90)
-            x1 = 20 + 5 * math.cos(math.radians(blade_angle))
-            y1 = 20 + 5 * math.sin(math.radians(blade_angle))
-            x2 = 20 + 18 * math.cos(math.radians(blade_angle))
-            y2 = 20 + 18 * math.sin(math.radians(blade_angle))
-            
-            canvas.create_line(x1, y1, x2, y2, width=3, fill="#333333")
-            tip_angle = blade_angle + 30
-            x3 = x2 + 5 * math.cos(math.radians(tip_angle))
-            y3 = y2 + 5 * math.sin(math.radians(tip_angle))
-            canvas.create_line(x2, y2, x3, y3, width=3, fill="#333333")
-    
-    def animate_fan(self, appliance):
-        if not self.appliance_states[appliance] or appliance not in self.animation_canvases:
-            return
-        
-        self.animation_angles[appliance] = (self.animation_angles[appliance] + 10) % 360
-        
-        self.draw_fan(appliance)
-        
-        animation_id = self.root.after(50, lambda: self.animate_fan(appliance))
-        self.animations[appliance] = animation_id
-    
-    def draw_light_bulb(self, appliance):
-        if appliance not in self.animation_canvases:
-            return
-            
-        canvas = self.animation_canvases[appliance]
-        canvas.delete("all")
-            
-        brightness = self.bulb_brightness.get(appliance, 0.0)
-        
-        bulb_color = self.get_brightness_color(brightness)
-        glow_color = self.get_brightness_color(brightness * 0.7)
-        
-        canvas.create_oval(5, 5, 25, 25, fill=glow_color, outline="")
-        
-        canvas.create_oval(8, 8, 22, 22, fill=bulb_color, outline="#333333")
-        
-        canvas.create_rectangle(12, 22, 18, 30, fill="#888888", outline="#333333")
-        canvas.create_rectangle(10, 30, 20, 35, fill="#888888", outline="#333333")
-    
-    def animate_light_bulb(self, appliance, direction):
-        if not self.appliance_states[appliance] or appliance not in self.animation_canvases:
-            return
-        
-        current = self.bulb_brightness.get(appliance, 0.0)
-        current += direction * 0.05
-        
-        if current >= 1.0:
-            current = 1.0
-            direction = -1
-        elif current <= 0.4:
-            direction = 1
-            
-        self.bulb_brightness[appliance] = current
-        
-        self.draw_light_bulb(appliance)
-        
-        animation_id = self.root.after(100, lambda: self.animate_light_bulb(appliance, direction))
-        self.animations[appliance] = animation_id
-    
-    def get_brightness_color(self, brightness):
-        r = 255
-        g = 255
-        b = int(100 + brightness * 155)
-        return f'#{r:02x}{g:02x}{b:02x}'
-    
-    def draw_ac(self, appliance):
-        if appliance not in self.animation_canvases:
+        row = DeviceRow(frame, label, button, canvas)
+        button.config(command=lambda r=row: self.toggle_appliance(r.device_id))
+        row.device_id = device.id
+        self.buttons[device.id] = button
+        self.animation_canvases[device.id] = canvas
+        return row
+
+    def unbind_row(self, row, keep=False):
+        self.stop_animation(row.device_id)
+        if not keep:
+            del self.buttons[row.device_id]
+            del self.animation_canvases[row.device_id]
+        row.device_id = None
+
+    def bind_row(self, row, device):
+        if row.device_id == device.id:
             return
-            
-        canvas = self.animation_canvases[appliance]
-        canvas.delete("all")
-            
-        canvas.create_rectangle(5, 5, 20, 25, fill="#cccccc", outline="#333333")
+        row.device_id = device.id
         
-        for y in range(8, 23, 5):
-            canvas.create_line(20, y, 25, y, fill="#333333")
+        row.label.configure(text=f"{device.name}:")
         
-        particles = self.ac_particles.get(appliance, [])
+        button_text = "ON" if self.appliance_states[device.id] else "OFF"
+        button_bg = self.on_color if self.appliance_states[device.id] else self.off_color
+        row.button.configure(text=button_text, bg=button_bg)
         
-        updated_particles = []
-        for x, y, size in particles:
-            if x < 60:
-                canvas.create_oval(x, y, x+size, y+size, fill="#add8e6", outline="")
-                updated_particles.append((x+2, y, size))
-                
-        if random.random() < 0.3:
-            for _ in range(random.randint(1, 3)):
-                y = random.randint(5, 25)
-                size = random.uniform(1, 3)
-                updated_particles.append((25, y, size))
-                
-        self.ac_particles[appliance] = updated_particles
-    
-    def animate_ac_wind(self, appliance):
-        if not self.appliance_states[appliance] or appliance not in self.animation_canvases:
-            return
+        canvas_width, canvas_height = self.animation_class(device).canvas_size
+        row.canvas.configure(width=canvas_width, height=canvas_height)
         
-        self.draw_ac(appliance)
+        self.buttons[device.id] = row.button
+        self.animation_canvases[device.id] = row.canvas
         
-        animation_id = self.root.after(70, lambda: self.animate_ac_wind(appliance))
-        self.animations[appliance] = animation_id
-    
-    def draw_tv(self, appliance):
-        if appliance not in self.animation_canvases:
+        if self.appliance_states[device.id]:
+            self.start_animation(device.id)
+
+    def toggle_appliance(self, device_id):
+        clicked = time.perf_counter()
+        state = not self.appliance_states[device_id]
+        self.set_appliance(device_id, state)
+        if self.device_link is not None:
+            self.device_link.submit([(device_id, state)])
+        self.state_store.set(device_id, state)
+        self.update_status(f"{self.registry[device_id].name} turned {'ON' if state else 'OFF'}")
+        self.state_writer.schedule(self.appliance_states)
+        if self.metrics is not None:
+            self.root.after_idle(self.metrics.observe_click, clicked)
+
+    def apply_states(self, states, description="Bulk update"):
+        clicked = time.perf_counter()
+        targets = self.registry.targets(states)
+        changed = [device_id for device_id, state in targets.items() if self.appliance_states[device_id] != state]
+        self.build_animations((device_id, targets[device_id]) for device_id in changed)
+        for device_id in changed:
+            self.set_appliance(device_id, targets[device_id])
+        if self.device_link is not None:
+            self.device_link.submit([(device_id, targets[device_id]) for device_id in changed])
+        self.state_store.write_all({device_id: targets[device_id] for device_id in changed})
+        
+        if changed:
+            self.update_status(f"{description}: {len(changed)} of {len(targets)} devices changed")
+            self.state_writer.schedule(self.appliance_states)
+        else:
+            self.update_status(f"{description}: no changes needed")
+        if self.metrics is not None:
+            self.root.after_idle(self.metrics.observe_click, clicked)
+        return changed
+
+    def reconcile(self, results):
+        corrected = []
+        self.build_animations((device_id, state) for device_id, state, _error in results)
+        for device_id, state, error in results:
+            if self.appliance_states[device_id] != state:
+                self.set_appliance(device_id, state)
+                corrected.append((device_id, state, error))
+        if not corrected:
             return
-            
-        canvas = self.animation_canvases[appliance]
-        canvas.delete("all")
-            
-        canvas.create_rectangle(5, 5, 45, 35, fill="#222222", outline="#000000", width=2)
-        
-        channel = self.tv_state["channel"]
-        frame = self.tv_state["frame"]
-        
-        if channel == 0:
-            canvas.create_rectangle(8, 8, 42, 15, fill="#ff0000", outline="")
-            text_pos = 42 - (frame % 50)
-            canvas.create_text(text_pos, 12, text="NEWS", fill="white", font=("Arial", 6))
-            canvas.create_rectangle(8, 16, 42, 32, fill="#dddddd", outline="")
-            for i in range(3):
-                canvas.create_line(10, 20+i*4, 40, 20+i*4, fill="#555555")
-        
-        elif channel == 1:
-            if frame % 20 < 10:
-                canvas.create_rectangle(8, 8, 42, 32, fill="#0000ff", outline="")
-                canvas.create_oval(15, 15, 25, 25, fill="#ffff00", outline="")
-            else:
-                canvas.create_rectangle(8, 8, 42, 32, fill="#008800", outline="")
-                canvas.create_rectangle(25, 15, 35, 25, fill="#ff0000", outline="")
-        
-        elif channel == 2:
-            canvas.create_rectangle(8, 8, 42, 32, fill="#00aa00", outline="")
-            ball_x = 25 + 15 * math.cos(frame * 0.2)
-            ball_y = 20 + 8 * math.sin(frame * 0.3)
-            canvas.create_oval(ball_x-3, ball_y-3, ball_x+3, ball_y+3, fill="white", outline="")
+        self.state_store.write_all({device_id: state for device_id, state, _error in corrected})
+        self.state_writer.schedule(self.appliance_states)
         
-        canvas.create_rectangle(20, 35, 30, 38, fill="#444444", outline="#000000")
+        device_id, state, error = corrected[0]
+        name = self.registry[device_id].name
+        if error is not None:
+            message = f"{name} failed ({error}), back to {'ON' if state else 'OFF'}"
+        else:
+            message = f"{name} reported {'ON' if state else 'OFF'}"
+        if len(corrected) > 1:
+            message = f"{len(corrected)} devices did not take the change; {message}"
+        self.update_status(message)
+
+    def apply_scene(self, scene_id):
+        scene = self.registry.scenes[scene_id]
+        return self.apply_states(scene.states, scene.name)
+
+    def set_appliance(self, device_id, state):
+        self.build_animations([(device_id, state)])
+        self.appliance_states[device_id] = state
+        
+        if device_id in self.buttons:
+            text = "ON" if state else "OFF"
+            color = self.on_color if state else self.off_color
+            self.buttons[device_id].configure(text=text, bg=color)
+        self.record_change(device_id, state)
+        if self.simulation is not None:
+            self.simulation.set_state(device_id, state)
+        
+        if state:
+            self.start_animation(device_id)
+        else:
+            self.stop_animation(device_id)
     
-    def animate_tv(self, appliance):
-        if not self.appliance_states[appliance] or appliance not in self.animation_canvases:
+    def start_animations(self):
+        self.pending_starts = [
+            device_id for device_id in self.animation_canvases if self.appliance_states[device_id]
+        ]
+        self.start_next_animation()
+        if self.use_sprites and hasattr(self.backend.tk, "PhotoImage"):
+            self.root.after_idle(self.load_sprites)
+
+    def load_sprites(self):
+        from sprites import SheetBuild
+        try:
+            self.sprite_build = SheetBuild()
+        except OSError as e:
+            self.update_status(f"Sprite cache unavailable: {e}")
             return
-        
-        self.tv_state["frame"] = (self.tv_state["frame"] + 1) % 100
-        
-        if self.tv_state["frame"] == 0 and random.random() < 0.3:
-            self.tv_state["channel"] = (self.tv_state["channel"] + 1) % 3
-        
-        self.draw_tv(appliance)
-        
-        animation_id = self.root.after(100, lambda: self.animate_tv(appliance))
-        self.animations[appliance] = animation_id
-        
-    def draw_speaker(self, appliance):
-        if appliance not in self.animation_canvases:
+        self.poll_sprites()
+
+    def poll_sprites(self):
+        from sprites import load_frames
+        build = self.sprite_build
+        try:
+            build.collect()
+        except Exception as e:
+            build.cancel()
+            self.update_status(f"Sprite rendering failed: {e}")
             return
-            
-        canvas = self.animation_canvases[appliance]
-        canvas.delete("all")
-            
-        canvas.create_rectangle(5, 10, 15, 30, fill="#333333", outline="#222222")
         
-        canvas.create_oval(8, 15, 12, 25, fill="#666666", outline="#444444")
-        
-        waves = self.speaker_waves.get(appliance, [])
-        
-        for radius in waves:
-            x = 10 + radius
-            canvas.create_arc(
-                x-radius, 20-radius, x+radius, 20+radius,
-                start=270, extent=180, style="arc", outline="#333333", width=2
-            )
-        
-        updated_waves = [r+1 for r in waves if r < 25]
-        
-        if random.random() < 0.2 or not updated_waves:
-            updated_waves.append(3)
-            
-        self.speaker_waves[appliance] = updated_waves
+        for kind, path in build.paths.items():
+            if kind in self.sprites or kind in build.pending:
+                continue
+            try:
+                self.sprites[kind] = load_frames(self.backend.tk.PhotoImage, path, kind)
+            except (OSError, tk.TclError) as e:
+                self.update_status(f"Error loading sprites: {e}")
+                continue
+            for device_id in list(self.clock.subscribers):
+                if self.registry[device_id].animation == kind:
+                    self.start_animation(device_id)
+        
+        if not build.done():
+            self.root.after(SPRITE_POLL_MS, self.poll_sprites)
+
+    def start_next_animation(self):
+        while self.pending_starts:
+            device_id = self.pending_starts.pop(0)
+            if self.appliance_states[device_id] and not self.clock.is_registered(device_id):
+                self.start_animation(device_id)
+                break
+        if self.pending_starts:
+            self.root.after(STARTUP_STAGGER_MS, self.start_next_animation)
+
+    def animation_class(self, device):
+        return ANIMATIONS.get(device.animation, ButtonPulseAnimation)
     
-    def animate_speaker(self, appliance):
-        if not self.appliance_states[appliance] or appliance not in self.animation_canvases:
+    def start_animation(self, device_id):
+        self.stop_animation(device_id)
+        if device_id not in self.animation_canvases:
             return
         
-        self.draw_speaker(appliance)
+        animation = self.animation_for(device_id)
+        animation.sprites = self.sprites.get(self.registry[device_id].animation)
         
-        animation_id = self.root.after(100, lambda: self.animate_speaker(appliance))
-        self.animations[appliance] = animation_id
+        animation.start(self.animation_canvases[device_id], self.buttons[device_id], self.frame_cache)
+        animation.tick()
+        callback = animation.tick
+        if self.metrics is not None:
+            callback = self.metrics.timed(device_id, callback)
+        self.clock.register(device_id, callback, animation.divisor, animation.priority)
     
-    def draw_radio(self, appliance):
-        if appliance not in self.animation_canvases:
-            return
-            
-        canvas = self.animation_canvases[appliance]
-        canvas.delete("all")
-            
-        canvas.create_rectangle(5, 10, 35, 30, fill="#884400", outline="#663300", width=2)
-        
-        canvas.create_oval(10, 15, 18, 23, fill="#cccccc", outline="#333333")
-        canvas.create_line(14, 19, 17, 19, fill="#333333", width=1)
-        
-        canvas.create_rectangle(20, 13, 32, 27, fill="#222222", outline="#111111")
-        
-        bars = self.radio_bars.get(appliance, [])
-        if not bars:
-            bars = [0, 0, 0, 0, 0]
-        
-        bar_width = 2
-        for i, height in enumerate(bars):
-            x = 21 + i * (bar_width + 1)
-            canvas.create_rectangle(
-                x, 26-height, x+bar_width, 26,
-                fill="#00ff00", outline=""
-            )
-        
-        updated_bars = []
-        for _ in range(5):
-            if random.random() < 0.7:
-                height = random.randint(2, 12)
-            else:
-                height = bars[_] if _ < len(bars) else random.randint(2, 12)
-            updated_bars.append(height)
+    def animation_for(self, device_id):
+        animation = self.animations.get(device_id)
+        if animation is None:
+            device = self.registry[device_id]
+            animation = self.animation_class(device)(**device.options)
+            self.animations[device_id] = animation
+        return animation
+
+    def build_animations(self, changes):
+        for device_id, state in changes:
+            if state and device_id in self.animation_canvases:
+                self.animation_for(device_id)
+
+    def stop_animation(self, device_id):
+        if self.clock.unregister(device_id):
+            if self.appliance_states[device_id]:
+                self.buttons[device_id].configure(bg=self.on_color)
             
-        self.radio_bars[appliance] = updated_bars
+            self.animations[device_id].stop()
     
-    def animate_radio(self, appliance):
-        if not self.appliance_states[appliance] or appliance not in self.animation_canvases:
-            return
-        
-        self.draw_radio(appliance)
-        
-        animation_id = self.root.after(200, lambda: self.animate_radio(appliance))
-        self.animations[appliance] = animation_id
-    
-    def hex_to_rgb(self, hex_color):
-        hex_color = hex_color.lstrip('#')
-        return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-    
-    def rgb_to_hex(self, r, g, b):
-        return f'#{r:02x}{g:02x}{b:02x}'
-        
+    def record_change(self, device_id, state):
+        self.journal.append(device_id, not state, state)
+        if self.journal_flush_id is None:
+            self.journal_flush_id = self.root.after(JOURNAL_FLUSH_MS, self.flush_journal)
+
+    def flush_journal(self):
+        self.journal_flush_id = None
+        try:
+            self.journal.flush()
+        except OSError as e:
+            self.update_status(f"Error writing journal: {e}")
+        
+        error = self.state_writer.take_error()
+        if error is not None:
+            self.update_status(f"Error saving configuration: {error}")
+        elif self.state_writer.busy():
+            self.journal_flush_id = self.root.after(JOURNAL_FLUSH_MS, self.flush_journal)
+
     def update_status(self, message):
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        timestamp = time.strftime("%H:%M:%S")
         self.status_var.set(f"{timestamp} - {message}")
 
     def save_states(self):
         try:
-            with open("appliance_states.json", "w") as f:
-                json.dump(self.appliance_states, f)
+            self.state_writer.flush(self.appliance_states)
             self.update_status("Configuration saved")
         except Exception as e:
             self.update_status(f"Error saving configuration: {e}")
 
+    def on_unmap(self, event):
+        if event.widget is self.root:
+            self.clock.pause()
+
+    def on_map(self, event):
+        if event.widget is self.root:
+            self.clock.resume()
+            self.schedule_metrics_overlay()
+
+    def on_visibility(self, event):
+        if event.widget is not self.root:
+            return
+        if event.state == "VisibilityFullyObscured":
+            self.clock.pause()
+        else:
+            self.clock.resume()
+            self.schedule_metrics_overlay()
+
+    def on_focus_in(self, event):
+        self.clock.set_throttle(1)
+
+    def on_focus_out(self, event):
+        self.root.after_idle(self.check_focus)
+
+    def check_focus(self):
+        if self.root.focus_get() is None:
+            self.clock.set_throttle(UNFOCUSED_THROTTLE)
+
+    def start_control_api(self, port=None, path=None):
+        from control_api import CONTROL_PORT, ControlBridge, ControlServer
+        self.control_server = ControlServer(
+            ControlBridge(self), port=CONTROL_PORT if port is None else port, path=path
+        )
+        self.control_server.start()
+        where = path or f"{self.control_server.host}:{self.control_server.port}"
+        self.update_status(f"Control API listening on {where}")
+
+    def start_device_link(self, address=None):
+        from adapters import DeviceLink
+        try:
+            self.device_link = DeviceLink.for_registry(self.root, self.registry, self.reconcile, address)
+        except ValueError as e:
+            self.update_status(f"Device link unavailable: {e}")
+            return
+        self.device_link.start()
+        self.update_status(
+            f"Device link: {len(self.device_link.routes)} devices on {len(self.device_link.clients)} gateways"
+        )
+
+    def enable_simulation(self, speed=1.0):
+        try:
+            from simulation import HouseholdSimulation
+        except ImportError as e:
+            self.update_status(f"Simulation unavailable: {e}")
+            return False
+        self.simulation = HouseholdSimulation(self.registry)
+        self.simulation.set_states(self.appliance_states)
+        self.simulation_speed = speed
+        
+        self.energy_var = self.backend.tk.StringVar()
+        energy_bar = self.backend.ttk.Label(
+            self.status_frame,
+            textvariable=self.energy_var,
+            relief=tk.SUNKEN,
+            anchor=tk.E
+        )
+        energy_bar.pack(side=tk.RIGHT)
+        self.update_energy()
+        self.root.after(SIMULATION_MS, self.step_simulation)
+        return True
+
+    def step_simulation(self):
+        self.simulation.step(SIMULATION_MS / 1000 * self.simulation_speed)
+        self.update_energy()
+        self.root.after(SIMULATION_MS, self.step_simulation)
+
+    def update_energy(self):
+        totals = self.simulation.totals()
+        text = (f"{totals['power_w'] / 1000:.2f} kW | {totals['energy_kwh']:.2f} kWh | "
+                f"{totals['mean_temperature']:.1f} °C")
+        if self.simulation_speed != 1:
+            clock = time.strftime("%d %b %H:%M", time.localtime(totals["time"]))
+            text += f" | {clock} (x{self.simulation_speed:g})"
+        self.energy_var.set(text)
+
+    def enable_metrics(self, overlay=True, export_path=None):
+        from metrics import Metrics
+        self.metrics = Metrics()
+        self.clock.metrics = self.metrics
+        for key, subscriber in self.clock.subscribers.items():
+            subscriber.callback = self.metrics.timed(key, subscriber.callback)
+        
+        if overlay:
+            self.metrics_label = self.backend.tk.Label(
+                self.root,
+                font=("Courier", 9),
+                bg="#333333",
+                fg="#ffffff",
+                anchor=tk.W
+            )
+            self.metrics_label.pack(side=tk.BOTTOM, fill=tk.X)
+            self.metrics_shown = True
+            self.root.bind("<F12>", self.toggle_metrics_overlay, add="+")
+            self.update_metrics_overlay()
+        if export_path:
+            self.metrics_path = export_path
+            self.root.after(METRICS_EXPORT_MS, self.export_metrics)
+
+    def update_metrics_overlay(self):
+        self.metrics_overlay_id = None
+        self.metrics_label.configure(text=self.metrics.overlay_text(self.animation_canvases))
+        self.schedule_metrics_overlay()
+
+    def schedule_metrics_overlay(self):
+        if self.metrics_shown and not self.clock.paused and self.metrics_overlay_id is None:
+            self.metrics_overlay_id = self.root.after(METRICS_OVERLAY_MS, self.update_metrics_overlay)
+
+    def toggle_metrics_overlay(self, event=None):
+        self.metrics_shown = not self.metrics_shown
+        if self.metrics_shown:
+            self.metrics_label.pack(side=tk.BOTTOM, fill=tk.X)
+            self.update_metrics_overlay()
+        else:
+            self.metrics_label.pack_forget()
+            if self.metrics_overlay_id is not None:
+                self.root.after_cancel(self.metrics_overlay_id)
+                self.metrics_overlay_id = None
+
+    def export_metrics(self, reschedule=True):
+        from metrics import prometheus_text
+        try:
+            if self.metrics_path.endswith(".prom"):
+                write_text_atomic(
+                    self.metrics_path, prometheus_text(self.metrics, self.animation_canvases, self.frame_cache)
+                )
+            else:
+                write_json_atomic(self.metrics_path, self.metrics.snapshot(self.animation_canvases, self.frame_cache))
+        except OSError as e:
+            self.update_status(f"Error writing metrics: {e}")
+        if reschedule:
+            self.root.after(METRICS_EXPORT_MS, self.export_metrics)
+
+    def on_close(self):
+        try:
+            if self.metrics_path is not None:
+                self.export_metrics(reschedule=False)
+            if self.control_server is not None:
+                self.control_server.stop()
+            if self.device_link is not None:
+                self.device_link.stop()
+            self.scheduler.close()
+            self.state_writer.close()
+            self.journal.close()
+            self.state_store.close()
+        finally:
+            self.root.destroy()
+
     def load_states(self):
+        saved_states = {}
+        saved_at = 0.0
         try:
-            with open("appliance_states.json", "r") as f:
+            with open(STATE_FILE, "r") as f:
                 saved_states = json.load(f)
-                self.appliance_states.update(saved_states)
-                self.update_status("Configuration loaded")
+            saved_at = os.path.getmtime(STATE_FILE)
+            self.update_status("Configuration loaded")
         except FileNotFoundError:
             self.update_status("No saved configuration found")
         except Exception as e:
             self.update_status(f"Error loading configuration: {e}")
-            
-        for appliance, state in self.appliance_states.items():
-            if appliance in self.buttons:
-                text = "ON" if state else "OFF"
-                color = self.on_color if state else self.off_color
-                self.buttons[appliance].configure(text=text, bg=color)
-                
-                if state:
-                    self.start_animation(appliance)
+        
+        journal_states = self.journal.current_state()
+        if not self.journal.is_empty() and self.journal.last_timestamp >= saved_at:
+            saved_states = journal_states
+            self.update_status("Configuration restored from journal")
+        
+        for key, state in saved_states.items():
+            device = self.registry.resolve(key)
+            if device is not None:
+                self.appliance_states[device.id] = bool(state)
+        
+        for device_id, state in self.appliance_states.items():
+            if journal_states.get(device_id, False) != state:
+                self.journal.append(device_id, not state, state)
+        self.journal.flush()
+
+    def load_schedules(self):
+        try:
+            errors = self.scheduler.load()
+        except Exception as e:
+            self.update_status(f"Error loading schedules: {e}")
+            return
+        if errors:
+            self.update_status(f"Skipped {len(errors)} schedule rules: {errors[0]}")
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Home appliance control panel")
+    parser.add_argument("--control-port", type=int, help="serve the control API on 127.0.0.1:PORT")
+    parser.add_argument("--control-socket", help="serve the control API on a Unix socket")
+    parser.add_argument("--gateway", metavar="HOST:PORT",
+                        help="send state changes for devices without a gateway to this device server or socket")
+    parser.add_argument("--no-sprites", action="store_true", help="draw animations with canvas shapes only")
+    parser.add_argument("--simulate", type=float, nargs="?", const=1.0, metavar="SPEED",
+                        help="simulate power, energy and temperature, optionally faster than real time")
+    parser.add_argument("--metrics", action="store_true", help="show the performance overlay (F12 hides it)")
+    parser.add_argument("--metrics-file", help="export metrics every 10 s as JSON, or Prometheus text for *.prom")
+    args = parser.parse_args()
+
     root = tk.Tk()
     style = ttk.Style()
     style.theme_use('clam')
-    app = HomeApplianceControl(root)
+    app = HomeApplianceControl(root, use_sprites=not args.no_sprites, gateway=args.gateway)
+    if args.control_port is not None or args.control_socket:
+        app.start_control_api(port=args.control_port, path=args.control_socket)
+    if args.simulate:
+        app.enable_simulation(args.simulate)
+    if args.metrics or args.metrics_file:
+        app.enable_metrics(overlay=args.metrics, export_path=args.metrics_file)
     root.mainloop() 
\ No newline at end of file
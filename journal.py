@@ -0,0 +1,289 @@
+import bisect
+import json
+import mmap
+import os
+import struct
+import time
+
+RECORD = struct.Struct("<dIBBxx")
+FLUSH_RECORDS = 256
+SEGMENT_RECORDS = 1 << 20
+SEGMENT_DAYS = 1
+RETENTION_DAYS = 400
+
+
+class JournalSegment:
+    def __init__(self, directory, number):
+        self.number = number
+        self.log_path = os.path.join(directory, f"segment-{number:06d}.log")
+        self.snapshot_path = os.path.join(directory, f"segment-{number:06d}.snap")
+        self.snapshot = None
+
+    def load_snapshot(self):
+        if self.snapshot is None:
+            with open(self.snapshot_path, "r") as f:
+                self.snapshot = json.load(f)
+        return self.snapshot
+
+    @property
+    def start(self):
+        return self.load_snapshot()["timestamp"]
+
+    def record_count(self):
+        try:
+            return os.path.getsize(self.log_path) // RECORD.size
+        except FileNotFoundError:
+            return 0
+
+    def records(self, start=None, end=None):
+        count = self.record_count()
+        if count == 0:
+            return
+        with open(self.log_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lo = 0 if start is None else self.search(mm, count, start)
+            hi = count if end is None else self.search(mm, count, end)
+            view = memoryview(mm)[lo * RECORD.size:hi * RECORD.size]
+            try:
+                yield from RECORD.iter_unpack(view)
+            finally:
+                view.release()
+
+    @staticmethod
+    def search(mm, count, timestamp):
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if RECORD.unpack_from(mm, mid * RECORD.size)[0] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+class Journal:
+    def __init__(self, directory, flush_records=FLUSH_RECORDS, segment_records=SEGMENT_RECORDS,
+                 retention_days=RETENTION_DAYS, segment_days=SEGMENT_DAYS, read_only=False):
+        self.directory = directory
+        self.flush_records = flush_records
+        self.segment_records = segment_records
+        self.segment_seconds = segment_days * 86400 if segment_days else None
+        self.retention = retention_days * 86400 if retention_days else None
+        self.read_only = read_only
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+
+        self.devices_path = os.path.join(directory, "devices.txt")
+        self.device_ids = []
+        self.device_index = {}
+        self.devices_file = None
+        if os.path.exists(self.devices_path):
+            with open(self.devices_path, "r") as f:
+                for line in f:
+                    self.register_device(line.rstrip("\n"), persist=False)
+
+        self.segments = self.find_segments()
+        self.buffer = bytearray()
+        self.buffered = 0
+        self.last_timestamp = 0.0
+        self.states = {}
+        self.log = None
+        self.segment_count = 0
+        self.segment_start = 0.0
+        if self.segments:
+            self.recover()
+        if not read_only:
+            self.compact()
+
+    def find_segments(self):
+        numbers = sorted(
+            int(name[8:14])
+            for name in os.listdir(self.directory)
+            if name.startswith("segment-") and name.endswith(".snap")
+        )
+        return [JournalSegment(self.directory, number) for number in numbers]
+
+    def register_device(self, device_id, persist=True):
+        index = self.device_index.get(device_id)
+        if index is None:
+            index = len(self.device_ids)
+            self.device_ids.append(device_id)
+            self.device_index[device_id] = index
+            if persist:
+                if self.devices_file is None:
+                    self.devices_file = open(self.devices_path, "a")
+                self.devices_file.write(device_id + "\n")
+                self.devices_file.flush()
+        return index
+
+    def recover(self):
+        segment = self.segments[-1]
+        size = os.path.getsize(segment.log_path) if os.path.exists(segment.log_path) else 0
+        if size % RECORD.size and not self.read_only:
+            with open(segment.log_path, "r+b") as f:
+                f.truncate(size - size % RECORD.size)
+
+        snapshot = segment.load_snapshot()
+        self.states = dict(snapshot["states"])
+        self.last_timestamp = self.segment_start = snapshot["timestamp"]
+        for timestamp, index, _old, new in segment.records():
+            self.states[self.device_ids[index]] = bool(new)
+            self.last_timestamp = timestamp
+        self.segment_count = segment.record_count()
+        if not self.read_only:
+            self.log = open(segment.log_path, "ab")
+
+    def is_empty(self):
+        return not self.segments
+
+    def current_state(self):
+        return dict(self.states)
+
+    def append(self, device_id, old, new, timestamp=None):
+        if self.read_only:
+            raise ValueError(f"journal {self.directory!r} is open read-only")
+        timestamp = max(time.time() if timestamp is None else timestamp, self.last_timestamp)
+        if self.log is None or self.segment_seconds and timestamp - self.segment_start >= self.segment_seconds:
+            self.rotate(timestamp)
+        self.last_timestamp = timestamp
+        self.buffer += RECORD.pack(timestamp, self.register_device(device_id), bool(old), bool(new))
+        self.buffered += 1
+        self.states[device_id] = bool(new)
+        if self.buffered >= self.flush_records:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        self.log.write(self.buffer)
+        self.log.flush()
+        self.segment_count += self.buffered
+        self.buffer.clear()
+        self.buffered = 0
+        if self.segment_count >= self.segment_records:
+            self.rotate()
+
+    def rotate(self, timestamp=None):
+        if self.log is not None:
+            self.flush()
+            self.log.close()
+        number = self.segments[-1].number + 1 if self.segments else 1
+        segment = JournalSegment(self.directory, number)
+        timestamp = self.last_timestamp if timestamp is None else timestamp
+        segment.snapshot = {"timestamp": timestamp, "states": dict(self.states)}
+        temp_path = segment.snapshot_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(segment.snapshot, f)
+        os.replace(temp_path, segment.snapshot_path)
+        self.segments.append(segment)
+        self.log = open(segment.log_path, "ab")
+        self.segment_count = 0
+        self.segment_start = timestamp
+        self.compact(timestamp)
+
+    def compact(self, now=None):
+        if self.retention is None:
+            return
+        horizon = (time.time() if now is None else now) - self.retention
+        while len(self.segments) > 1 and self.segments[1].start <= horizon:
+            segment = self.segments.pop(0)
+            for path in (segment.log_path, segment.snapshot_path):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        if self.log is not None:
+            self.flush()
+            self.log.close()
+            self.log = None
+        if self.devices_file is not None:
+            self.devices_file.close()
+            self.devices_file = None
+
+    def segments_between(self, start, end):
+        starts = [segment.start for segment in self.segments]
+        first = max(0, bisect.bisect_right(starts, start) - 1)
+        last = bisect.bisect_right(starts, end)
+        return self.segments[first:last]
+
+    def events(self, start, end):
+        self.flush()
+        for segment in self.segments_between(start, end):
+            for timestamp, index, old, new in segment.records(start, end):
+                yield timestamp, self.device_ids[index], bool(old), bool(new)
+
+    def state_at(self, timestamp):
+        self.flush()
+        segments = self.segments_between(timestamp, timestamp)
+        if not segments:
+            return {}
+        segment = segments[0]
+        states = dict(segment.load_snapshot()["states"])
+        for _timestamp, index, _old, new in segment.records(None, timestamp):
+            states[self.device_ids[index]] = bool(new)
+        return states
+
+    def on_between(self, start, end):
+        on = {device_id for device_id, state in self.state_at(start).items() if state}
+        for _timestamp, device_id, _old, new in self.events(start, end):
+            if new:
+                on.add(device_id)
+        return on
+
+    def on_time(self, start, end):
+        states = self.state_at(start)
+        since = {device_id: start for device_id, state in states.items() if state}
+        totals = {}
+        for timestamp, device_id, _old, new in self.events(start, end):
+            if new:
+                since.setdefault(device_id, timestamp)
+            elif device_id in since:
+                totals[device_id] = totals.get(device_id, 0.0) + timestamp - since.pop(device_id)
+        for device_id, on_since in since.items():
+            totals[device_id] = totals.get(device_id, 0.0) + end - on_since
+        return totals
+
+
+def parse_time(text):
+    from datetime import datetime
+    return datetime.fromisoformat(text).timestamp()
+
+
+def main():
+    import argparse
+    from datetime import datetime
+    parser = argparse.ArgumentParser(description="Query the appliance state journal")
+    parser.add_argument("--dir", default="appliance_journal")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("events", "on-between", "on-time"):
+        command = commands.add_parser(name)
+        command.add_argument("start", type=parse_time, help="ISO date/time")
+        command.add_argument("end", type=parse_time, help="ISO date/time")
+    at = commands.add_parser("state-at")
+    at.add_argument("time", type=parse_time, help="ISO date/time")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dir):
+        raise SystemExit(f"no journal at {args.dir}")
+    journal = Journal(args.dir, read_only=True)
+    try:
+        if args.command == "events":
+            for timestamp, device_id, old, new in journal.events(args.start, args.end):
+                print(f"{datetime.fromtimestamp(timestamp).isoformat(timespec='seconds')} "
+                      f"{device_id} {'ON' if old else 'OFF'} -> {'ON' if new else 'OFF'}")
+        elif args.command == "on-between":
+            for device_id in sorted(journal.on_between(args.start, args.end)):
+                print(device_id)
+        elif args.command == "on-time":
+            for device_id, seconds in sorted(journal.on_time(args.start, args.end).items()):
+                print(f"{device_id} {seconds / 3600:.2f} h")
+        elif args.command == "state-at":
+            for device_id, state in sorted(journal.state_at(args.time).items()):
+                print(f"{device_id} {'ON' if state else 'OFF'}")
+    finally:
+        journal.close()
+
+
+if __name__ == "__main__":
+    main()
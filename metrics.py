@@ -0,0 +1,147 @@
+import bisect
+import time
+
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS_MS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return round(min(bound, self.max), 3)
+        return round(self.max, 3)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "mean": round(self.sum / self.count, 3) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 3),
+            "buckets": dict(zip([str(bound) for bound in BUCKETS_MS] + ["+Inf"], self.counts)),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.draw = {}
+        self.tick = Histogram()
+        self.jitter = Histogram()
+        self.click = Histogram()
+
+    def timed(self, key, callback):
+        histogram = self.draw.setdefault(key, Histogram())
+
+        def timed_callback(steps=1):
+            started = time.perf_counter()
+            callback(steps)
+            histogram.observe((time.perf_counter() - started) * 1000)
+
+        return timed_callback
+
+    def observe_tick(self, cost_ms):
+        self.tick.observe(cost_ms)
+
+    def observe_jitter(self, late_ms):
+        self.jitter.observe(max(0.0, late_ms))
+
+    def observe_click(self, started):
+        self.click.observe((time.perf_counter() - started) * 1000)
+
+    def snapshot(self, canvases, frame_cache=None):
+        snapshot = {
+            "timestamp": time.time(),
+            "draw_ms": {key: histogram.summary() for key, histogram in self.draw.items()},
+            "tick_ms": self.tick.summary(),
+            "jitter_ms": self.jitter.summary(),
+            "click_to_repaint_ms": self.click.summary(),
+            "canvas_items": {key: len(canvas.find_all()) for key, canvas in canvases.items()},
+        }
+        if frame_cache is not None:
+            snapshot["frame_cache"] = frame_cache.stats()
+        return snapshot
+
+    def overlay_text(self, canvases):
+        slowest = max(self.draw.items(), key=lambda item: item[1].quantile(0.99), default=None)
+        parts = [
+            f"tick p99 {self.tick.quantile(0.99):g} ms",
+            f"jitter p99 {self.jitter.quantile(0.99):g} ms",
+            f"click->paint p99 {self.click.quantile(0.99):g} ms",
+            f"items {sum(len(canvas.find_all()) for canvas in canvases.values())}",
+        ]
+        if slowest is not None:
+            parts.append(f"slowest {slowest[0]} p99 {slowest[1].quantile(0.99):g} ms")
+        return " | ".join(parts)
+
+
+def prometheus_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_histogram(lines, name, help_text, histograms):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, histogram in histograms:
+        label_text = ",".join(f'{key}="{prometheus_label(value)}"' for key, value in labels)
+        prefix = label_text + "," if label_text else ""
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, histogram.counts):
+            seen += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound / 1000:g}"}} {seen}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+        suffix = "{" + label_text + "}" if label_text else ""
+        lines.append(f"{name}_sum{suffix} {histogram.sum / 1000:.6f}")
+        lines.append(f"{name}_count{suffix} {histogram.count}")
+
+
+def prometheus_text(metrics, canvases, frame_cache=None):
+    lines = []
+    prometheus_histogram(
+        lines, "home_control_draw_seconds", "Time spent in one appliance animation frame.",
+        [((("device", key),), histogram) for key, histogram in metrics.draw.items()],
+    )
+    prometheus_histogram(
+        lines, "home_control_tick_seconds", "Time spent in one animation clock tick.", [((), metrics.tick)]
+    )
+    prometheus_histogram(
+        lines, "home_control_timer_lateness_seconds", "How late root.after fired the clock.", [((), metrics.jitter)]
+    )
+    prometheus_histogram(
+        lines, "home_control_click_to_repaint_seconds", "Time from a state change to the next idle repaint.",
+        [((), metrics.click)],
+    )
+    lines.append("# HELP home_control_canvas_items Live items on an animation canvas.")
+    lines.append("# TYPE home_control_canvas_items gauge")
+    for key, canvas in canvases.items():
+        lines.append(f'home_control_canvas_items{{device="{prometheus_label(key)}"}} {len(canvas.find_all())}')
+    if frame_cache is not None:
+        stats = frame_cache.stats()
+        lines.append("# HELP home_control_frame_cache_lookups_total Animation frame cache lookups.")
+        lines.append("# TYPE home_control_frame_cache_lookups_total counter")
+        lines.append(f'home_control_frame_cache_lookups_total{{result="hit"}} {stats["hits"]}')
+        lines.append(f'home_control_frame_cache_lookups_total{{result="miss"}} {stats["misses"]}')
+        lines.append("# HELP home_control_frame_cache_entries Frames held in the animation frame cache.")
+        lines.append("# TYPE home_control_frame_cache_entries gauge")
+        lines.append(f"home_control_frame_cache_entries {stats['size']}")
+    return "\n".join(lines) + "\n"
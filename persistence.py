@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+
+
+def write_json_atomic(path, data):
+    write_text_atomic(path, json.dumps(data))
+
+
+def write_text_atomic(path, text):
+    directory, name = os.path.split(os.path.abspath(path))
+    temp_path = os.path.join(directory, f".tmp-{os.getpid()}-{threading.get_ident()}-{name}")
+    try:
+        with open(temp_path, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class StateWriter:
+    def __init__(self, path, quiet_period=0.5, write=write_json_atomic):
+        self.path = path
+        self.quiet_period = quiet_period
+        self.write = write
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.pending = None
+        self.deadline = None
+        self.version = 0
+        self.written_version = 0
+        self.writes = 0
+        self.error = None
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="state-writer", daemon=True)
+        self.thread.start()
+
+    def schedule(self, states):
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("state writer is closed")
+            self.version += 1
+            self.pending = (self.version, dict(states))
+            self.deadline = time.monotonic() + self.quiet_period
+            self.condition.notify()
+
+    def take_pending(self):
+        pending = self.pending
+        self.pending = None
+        self.deadline = None
+        return pending
+
+    def flush(self, states=None):
+        with self.condition:
+            if states is not None:
+                self.version += 1
+                self.pending = (self.version, dict(states))
+            pending = self.take_pending()
+        if pending is not None:
+            self.commit(*pending)
+
+    def commit(self, version, states):
+        with self.write_lock:
+            if version <= self.written_version:
+                return
+            self.write(self.path, states)
+            self.written_version = version
+            self.writes += 1
+
+    def busy(self):
+        with self.condition:
+            return self.pending is not None or self.written_version < self.version
+
+    def take_error(self):
+        with self.condition:
+            error = self.error
+            self.error = None
+        return error
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+        self.flush()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.closed:
+                    if self.pending is None:
+                        self.condition.wait()
+                        continue
+                    remaining = self.deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                if self.closed:
+                    return
+                pending = self.take_pending()
+            try:
+                self.commit(*pending)
+                error = None
+            except Exception as e:
+                error = e
+            with self.condition:
+                self.error = error
@@ -0,0 +1,383 @@
+import functools
+import heapq
+import itertools
+import json
+import math
+import re
+import time
+
+from persistence import StateWriter
+
+SCHEDULE_FILE = "schedules.json"
+MAX_WAIT = 60.0
+CATCH_UP = 12 * 3600
+LATE_NOTICE = 5.0
+SAVE_DELAY = 1.0
+FIRE_BUDGET_MS = 20.0
+COMPACT_MIN = 1024
+SEARCH_DAYS = 370
+DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+DAY_GROUPS = {"daily": DAYS, "weekdays": DAYS[:5], "weekends": DAYS[5:]}
+SUN_EVENTS = ("sunrise", "sunset")
+DURATION = re.compile(r"(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m)?(?:(\d+(?:\.\d+)?)s)?")
+
+
+def parse_duration(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    match = DURATION.fullmatch(value.strip()) if isinstance(value, str) else None
+    if match is None or not any(match.groups()):
+        raise ValueError(f"bad duration {value!r}, expected seconds or e.g. '2h', '1h30m'")
+    hours, minutes, seconds = (float(part or 0) for part in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def parse_clock(text):
+    try:
+        hour, minute = (int(part) for part in text.split(":"))
+    except (AttributeError, ValueError):
+        hour = minute = -1
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"bad time {text!r}, expected HH:MM, 'sunrise' or 'sunset'")
+    return hour, minute
+
+
+def parse_days(days):
+    if isinstance(days, str):
+        days = DAY_GROUPS.get(days, [days])
+    try:
+        return weekdays(tuple(days))
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError(f"bad days {days!r}") from None
+
+
+@functools.lru_cache(maxsize=256)
+def weekdays(days):
+    return frozenset(DAYS.index(day[:3].lower()) for day in days)
+
+
+@functools.lru_cache(maxsize=4096)
+def shift_date(year, month, day, days):
+    noon = time.localtime(time.mktime((year, month, day + days, 12, 0, 0, 0, 0, -1)))
+    return noon.tm_year, noon.tm_mon, noon.tm_mday, noon.tm_wday, noon.tm_yday
+
+
+@functools.lru_cache(maxsize=4096)
+def clock_time(year, month, day, hour, minute):
+    return time.mktime((year, month, day, hour, minute, 0, 0, 0, -1))
+
+
+@functools.lru_cache(maxsize=4096)
+def sun_time(year, month, day, yday, latitude, longitude, rising):
+    gamma = 2 * math.pi * (yday - 1) / 365
+    eqtime = 229.18 * (0.000075 + 0.001868 * math.cos(gamma) - 0.032077 * math.sin(gamma)
+                       - 0.014615 * math.cos(2 * gamma) - 0.040849 * math.sin(2 * gamma))
+    decl = (0.006918 - 0.399912 * math.cos(gamma) + 0.070257 * math.sin(gamma)
+            - 0.006758 * math.cos(2 * gamma) + 0.000907 * math.sin(2 * gamma)
+            - 0.002697 * math.cos(3 * gamma) + 0.00148 * math.sin(3 * gamma))
+    lat = math.radians(latitude)
+    cos_ha = math.cos(math.radians(90.833)) / (math.cos(lat) * math.cos(decl)) - math.tan(lat) * math.tan(decl)
+    if not -1 <= cos_ha <= 1:
+        return None
+    noon = clock_time(year, month, day, 12, 0)
+    solar_noon = noon - noon % 86400 + (720 - 4 * longitude - eqtime) * 60
+    solar_noon += round((noon - solar_noon) / 86400) * 86400
+    half_day = 240 * math.degrees(math.acos(cos_ha))
+    return solar_noon - half_day if rising else solar_noon + half_day
+
+
+class Rule:
+    __slots__ = ("id", "name", "states", "config", "once", "at", "days", "offset", "location", "due")
+
+    def __init__(self, rule_id, config, states, location=None):
+        self.id = rule_id
+        self.name = config.get("name", rule_id)
+        self.states = states
+        self.config = config
+        self.location = location
+        self.due = None
+        self.once = config.get("once")
+        self.at = config.get("at")
+        if (self.once is None) == (self.at is None):
+            raise ValueError(f"rule {rule_id!r} needs exactly one of 'at', 'once' or 'after'")
+        if self.once is not None and (isinstance(self.once, bool) or not isinstance(self.once, (int, float))):
+            raise ValueError(f"rule {rule_id!r} has a non-numeric 'once' timestamp")
+        offset = config.get("offset", 0)
+        if isinstance(offset, bool) or not isinstance(offset, (int, float)) or abs(offset) > 720:
+            raise ValueError(f"rule {rule_id!r} needs an 'offset' in minutes between -720 and 720")
+        self.offset = offset * 60
+        self.days = parse_days(config.get("days", DAYS))
+        if self.at in SUN_EVENTS:
+            if location is None:
+                raise ValueError(f"rule {rule_id!r} uses {self.at} but the schedule has no location")
+        elif self.at is not None:
+            self.at = parse_clock(self.at)
+
+    def occurrence(self, year, month, day, weekday, yday):
+        if weekday not in self.days:
+            return None
+        if self.at in SUN_EVENTS:
+            at = sun_time(year, month, day, yday, *self.location, self.at == "sunrise")
+            if at is None:
+                return None
+        else:
+            at = clock_time(year, month, day, *self.at)
+        return at + self.offset
+
+    def next_after(self, timestamp):
+        if self.once is not None:
+            return self.once if self.once > timestamp else None
+        year, month, day = time.localtime(timestamp)[:3]
+        for days in range(-1, SEARCH_DAYS):
+            at = self.occurrence(*shift_date(year, month, day, days))
+            if at is not None and at > timestamp:
+                return at
+        return None
+
+    def __repr__(self):
+        return f"Rule({self.id!r}, due={self.due!r})"
+
+
+class Scheduler:
+    def __init__(self, root, registry, apply, path=SCHEDULE_FILE, clock=time.time,
+                 max_wait=MAX_WAIT, catch_up=CATCH_UP, budget_ms=FIRE_BUDGET_MS):
+        self.root = root
+        self.registry = registry
+        self.apply = apply
+        self.path = path
+        self.clock = clock
+        self.max_wait = max_wait
+        self.catch_up = catch_up
+        self.budget_ms = budget_ms
+        self.location = None
+        self.rules = {}
+        self.invalid = []
+        self.heap = []
+        self.stale = 0
+        self.collected = []
+        self.dirty = False
+        self.sequence = itertools.count()
+        self.after_id = None
+        self.wake_at = None
+        self.checked = clock()
+        self.writer = None
+        self.arms = 0
+        self.batches = 0
+        self.fired = 0
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                config = json.load(f)
+            location = config.get("location")
+            if location is not None:
+                self.location = (float(location["latitude"]), float(location["longitude"]))
+            entries = config.get("rules", [])
+            self.checked = min(float(config.get("checked", self.checked)), self.clock())
+        except FileNotFoundError:
+            return []
+        except Exception:
+            self.path = None
+            raise
+        errors = []
+        for entry in entries:
+            try:
+                self.add(entry, since=self.checked, save=False)
+            except (TypeError, ValueError) as e:
+                self.invalid.append(entry)
+                errors.append(str(e))
+        return errors
+
+    def new_id(self):
+        for n in itertools.count(len(self.rules) + 1):
+            if f"rule_{n}" not in self.rules:
+                return f"rule_{n}"
+
+    def rule_states(self, rule_id, config):
+        if "scene" in config:
+            scene = self.registry.scenes.get(config["scene"])
+            if scene is None:
+                raise ValueError(f"rule {rule_id!r} refers to unknown scene {config['scene']!r}")
+            return scene.states
+        if "states" in config:
+            states = config["states"]
+        elif "device" in config:
+            states = {config["device"]: config.get("state")}
+        else:
+            raise ValueError(f"rule {rule_id!r} needs a 'device', 'states' or 'scene'")
+        self.registry.check_states(states, f"rule {rule_id!r}")
+        return dict(states)
+
+    def add(self, config, since=None, save=True):
+        config = dict(config)
+        if "after" in config:
+            config["once"] = self.clock() + parse_duration(config.pop("after"))
+        rule_id = config.setdefault("id", self.new_id())
+        if rule_id in self.rules:
+            raise ValueError(f"duplicate rule id {rule_id!r}")
+        rule = Rule(rule_id, config, self.rule_states(rule_id, config), self.location)
+        rule.due = rule.next_after(self.clock() if since is None else since)
+        if rule.due is None and rule.once is not None:
+            if since is not None:
+                return None
+            raise ValueError(f"rule {rule_id!r} is in the past")
+        self.rules[rule_id] = rule
+        if rule.due is not None:
+            heapq.heappush(self.heap, (rule.due, next(self.sequence), rule))
+        if save:
+            self.save()
+            self.arm()
+        return rule
+
+    def remove(self, rule_id):
+        rule = self.rules.pop(rule_id)
+        if rule.due is not None:
+            rule.due = None
+            self.stale += 1
+            if self.stale > COMPACT_MIN and self.stale > len(self.heap) // 2:
+                self.heap = [entry for entry in self.heap if entry[2].due == entry[0]]
+                heapq.heapify(self.heap)
+                self.stale = 0
+        self.save()
+        return rule
+
+    def arm(self):
+        heap = self.heap
+        while heap and heap[0][2].due != heap[0][0]:
+            heapq.heappop(heap)
+            self.stale -= 1
+        if not heap:
+            self.disarm()
+            return
+        now = self.clock()
+        wake = min(heap[0][0], now + self.max_wait)
+        if self.after_id is not None:
+            if self.wake_at <= wake:
+                return
+            self.root.after_cancel(self.after_id)
+        self.wake_at = wake
+        self.after_id = self.root.after(max(0, math.ceil((wake - now) * 1000)), self.run_due)
+        self.arms += 1
+
+    def disarm(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+            self.wake_at = None
+
+    def occurrences(self, rule, now):
+        if rule.once is not None:
+            return (rule.once if now - rule.once <= self.catch_up else None), None
+        when = rule.due
+        if now - when > self.catch_up:
+            when = rule.next_after(now - self.catch_up)
+        last = None
+        while when is not None and when <= now:
+            last = when
+            when = rule.next_after(when)
+        return last, when
+
+    def run_due(self):
+        self.after_id = None
+        self.wake_at = None
+        now = self.clock()
+        deadline = time.perf_counter() + self.budget_ms / 1000
+        heap = self.heap
+        fired = self.collected
+        while heap and heap[0][0] <= now:
+            if time.perf_counter() > deadline:
+                self.wake_at = now
+                self.after_id = self.root.after(0, self.run_due)
+                return
+            due, _sequence, rule = heapq.heappop(heap)
+            if rule.due != due:
+                self.stale -= 1
+                continue
+            last, rule.due = self.occurrences(rule, now)
+            if last is not None:
+                fired.append((last, rule))
+            if rule.due is not None:
+                heapq.heappush(heap, (rule.due, next(self.sequence), rule))
+            elif rule.once is not None:
+                del self.rules[rule.id]
+                self.dirty = True
+        self.collected = []
+        self.checked = now
+        if fired:
+            self.fire(fired, now)
+        if fired or self.dirty:
+            self.dirty = False
+            self.save()
+        self.arm()
+
+    def fire(self, fired, now):
+        fired.sort(key=lambda item: item[0])
+        targets = {}
+        for _when, rule in fired:
+            targets.update(self.registry.targets(rule.states))
+        if len(fired) == 1:
+            description = f"Schedule: {fired[0][1].name}"
+        else:
+            description = f"Schedule: {len(fired)} rules"
+        late = now - fired[0][0]
+        if late > LATE_NOTICE:
+            description += f" ({late / 60:.0f} min late)"
+        self.batches += 1
+        self.fired += len(fired)
+        self.apply(targets, description)
+
+    def upcoming(self, limit=None):
+        rules = sorted((rule for rule in self.rules.values() if rule.due is not None), key=lambda rule: rule.due)
+        return rules if limit is None else rules[:limit]
+
+    def snapshot(self):
+        data = {"checked": self.checked, "rules": [rule.config for rule in self.rules.values()] + self.invalid}
+        if self.location is not None:
+            data["location"] = {"latitude": self.location[0], "longitude": self.location[1]}
+        return data
+
+    def save(self):
+        if self.path is None:
+            return
+        if self.writer is None:
+            self.writer = StateWriter(self.path, quiet_period=SAVE_DELAY)
+        self.writer.schedule(self.snapshot())
+
+    def close(self):
+        self.disarm()
+        if self.writer is not None:
+            self.writer.flush(self.snapshot())
+            self.writer.close()
+
+
+def describe(states):
+    return ", ".join(f"{key} {'ON' if state else 'OFF'}" for key, state in states.items())
+
+
+def main():
+    import argparse
+    from devices import DeviceRegistry
+
+    parser = argparse.ArgumentParser(description="List upcoming appliance schedule rules")
+    parser.add_argument("--file", default=SCHEDULE_FILE)
+    parser.add_argument("--hours", type=float, default=24.0, help="how far ahead to look")
+    args = parser.parse_args()
+
+    scheduler = Scheduler(None, DeviceRegistry.load(), None, path=args.file)
+    for error in scheduler.load():
+        print(f"skipped: {error}")
+    now = time.time()
+    end = now + args.hours * 3600
+    events = []
+    for rule in scheduler.rules.values():
+        when = rule.next_after(now)
+        while when is not None and when <= end:
+            events.append((when, rule))
+            when = rule.next_after(when)
+    for when, rule in sorted(events, key=lambda event: event[0]):
+        print(f"{time.strftime('%a %H:%M', time.localtime(when))}  {rule.name}: {describe(rule.states)}")
+    print(f"{len(events)} firings from {len(scheduler.rules)} rules in the next {args.hours:g} h")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import math
+import time
+
+import numpy as np
+
+from devices import DEVICE_TYPES, DeviceRegistry, house_config
+
+RATED_W = {"light": 60.0, "fan": 75.0, "ac": 1200.0, "tv": 120.0, "speaker": 30.0, "radio": 15.0}
+STANDBY_W = {"light": 0.0, "fan": 0.0, "ac": 2.0, "tv": 1.0, "speaker": 2.0, "radio": 1.0}
+AC_COP = 3.0
+AC_SETPOINT = 22.0
+FAN_BOOST = 0.2
+ROOM_UA = 120.0
+ROOM_CAPACITY = 2.0e6
+OUTDOOR_MEAN = 27.0
+OUTDOOR_SWING = 6.0
+MAX_STEP = 60.0
+ROOMS_LISTED = 10
+
+
+def outdoor_temperature(timestamp):
+    local = time.localtime(timestamp)
+    hour = local.tm_hour + local.tm_min / 60 + local.tm_sec / 3600
+    return OUTDOOR_MEAN + OUTDOOR_SWING * math.sin(2 * math.pi * (hour - 9) / 24)
+
+
+class HouseholdSimulation:
+    def __init__(self, devices, start=None, setpoint=AC_SETPOINT, max_step=MAX_STEP):
+        devices = list(devices)
+        self.ids = [device.id for device in devices]
+        self.index = {device_id: i for i, device_id in enumerate(self.ids)}
+        rooms = sorted({device.room for device in devices})
+        self.rooms = rooms
+        room_index = {room: i for i, room in enumerate(rooms)}
+
+        self.type = np.array([DEVICE_TYPES.index(device.type) for device in devices], dtype=np.intp)
+        self.room = np.array([room_index[device.room] for device in devices], dtype=np.intp)
+        self.rated = np.array([RATED_W[t] for t in DEVICE_TYPES])[self.type]
+        self.standby = np.array([STANDBY_W[t] for t in DEVICE_TYPES])[self.type]
+        self.is_ac = self.type == DEVICE_TYPES.index("ac")
+        self.is_fan = self.type == DEVICE_TYPES.index("fan")
+        self.on = np.zeros(len(devices), dtype=bool)
+
+        self.time = time.time() if start is None else start
+        self.setpoint = setpoint
+        self.max_step = max_step
+        self.temperature = np.full(len(rooms), outdoor_temperature(self.time))
+        self.power = self.standby.copy()
+        self.energy_j = np.zeros(len(devices))
+
+    def set_state(self, device_id, state):
+        self.on[self.index[device_id]] = state
+
+    def set_states(self, states):
+        self.on[:] = [bool(states.get(device_id, False)) for device_id in self.ids]
+
+    def step(self, seconds):
+        while seconds > 0:
+            dt = min(seconds, self.max_step)
+            self.advance(dt)
+            seconds -= dt
+
+    def advance(self, dt):
+        rooms = len(self.rooms)
+        running_ac = self.on & self.is_ac
+        fans = np.bincount(self.room, weights=self.on & self.is_fan, minlength=rooms) > 0
+
+        power = np.where(self.on, self.rated, self.standby)
+        gains = np.bincount(self.room, weights=np.where(self.is_ac, 0.0, power), minlength=rooms)
+        outdoor = outdoor_temperature(self.time)
+        net = ROOM_UA * (outdoor - self.temperature) + gains
+
+        capacity = np.bincount(self.room, weights=running_ac * self.rated * AC_COP, minlength=rooms)
+        capacity *= 1 + FAN_BOOST * fans
+        needed = np.maximum(net + (self.temperature - self.setpoint) * ROOM_CAPACITY / dt, 0.0)
+        load = np.minimum(1.0, needed / np.maximum(capacity, 1e-9))
+        removed = load * capacity
+        duty = load[self.room] * running_ac
+
+        power = np.where(self.is_ac & self.on, duty * self.rated, power)
+        self.temperature += dt * (net - removed) / ROOM_CAPACITY
+        self.power = power
+        self.energy_j += power * dt
+        self.time += dt
+
+    def totals(self):
+        by_type = np.bincount(self.type, weights=self.energy_j, minlength=len(DEVICE_TYPES)) / 3.6e6
+        return {
+            "time": self.time,
+            "power_w": float(self.power.sum()),
+            "energy_kwh": float(self.energy_j.sum() / 3.6e6),
+            "mean_temperature": float(self.temperature.mean()),
+            "outdoor_temperature": outdoor_temperature(self.time),
+            "energy_kwh_by_type": {t: float(kwh) for t, kwh in zip(DEVICE_TYPES, by_type)},
+        }
+
+    def room_temperatures(self):
+        return dict(zip(self.rooms, self.temperature.tolist()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Project household power and energy use")
+    parser.add_argument("--house", type=int, metavar="N", help="simulate a generated house with N devices")
+    parser.add_argument("--days", type=float, default=1.0)
+    parser.add_argument("--step", type=float, default=MAX_STEP, help="simulation step in seconds")
+    parser.add_argument("--on", type=float, default=0.5, help="fraction of devices switched on")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    registry = DeviceRegistry.from_config(house_config(args.house)) if args.house else DeviceRegistry.load()
+    simulation = HouseholdSimulation(registry, max_step=args.step)
+    simulation.on[:] = np.random.default_rng(args.seed).random(len(registry)) < args.on
+
+    started = time.perf_counter()
+    simulation.step(args.days * 86400)
+    elapsed = time.perf_counter() - started
+
+    totals = simulation.totals()
+    print(f"{len(registry)} devices, {len(simulation.rooms)} rooms, {args.days:g} days "
+          f"in {elapsed:.2f} s ({args.days * 86400 / elapsed:,.0f}x real time)")
+    print(f"energy        {totals['energy_kwh']:>12,.1f} kWh")
+    for device_type, kwh in totals["energy_kwh_by_type"].items():
+        print(f"  {device_type:<11} {kwh:>12,.1f} kWh")
+    print(f"power now     {totals['power_w'] / 1000:>12,.2f} kW")
+    print(f"mean indoor   {totals['mean_temperature']:>12.1f} C "
+          f"(outdoor {totals['outdoor_temperature']:.1f} C)")
+    rooms = sorted(simulation.room_temperatures().items(), key=lambda item: item[1])
+    for room, temperature in rooms if len(rooms) <= ROOMS_LISTED else (rooms[0], rooms[-1]):
+        print(f"  {room:<11} {temperature:>12.1f} C")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import hashlib
+import math
+import os
+import time
+
+import frames as frame_geometry
+from frames import BRIGHTNESS_STEPS, fan_frame, light_frame, tv_frame, tv_sprite_index
+
+SPRITE_DIR = "sprite_cache"
+SUPERSAMPLE = 3
+CHUNK_FRAMES = 8
+THEMES = {
+    "default": {"background": "#f0f0f0"},
+}
+
+FONT = {
+    "N": ("101", "111", "111", "111", "101"),
+    "E": ("111", "100", "110", "100", "111"),
+    "W": ("101", "101", "111", "111", "101"),
+    "S": ("111", "100", "111", "001", "111"),
+}
+
+
+def parse_color(color):
+    color = color.lstrip("#")
+    return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+
+
+class Raster:
+    def __init__(self, width, height, background):
+        self.width = width
+        self.height = height
+        self.pixels = [list(parse_color(background)) for _ in range(width * height)]
+
+    def blend(self, x, y, color, alpha):
+        if alpha <= 0 or not (0 <= x < self.width and 0 <= y < self.height):
+            return
+        pixel = self.pixels[y * self.width + x]
+        for i in range(3):
+            pixel[i] += (color[i] - pixel[i]) * min(alpha, 1.0)
+
+    def fill_box(self, x1, y1, x2, y2, color):
+        color = parse_color(color)
+        for y in range(max(0, math.floor(y1)), min(self.height, math.ceil(y2))):
+            cover_y = min(y + 1, y2) - max(y, y1)
+            for x in range(max(0, math.floor(x1)), min(self.width, math.ceil(x2))):
+                self.blend(x, y, color, cover_y * (min(x + 1, x2) - max(x, x1)))
+
+    def fill_shape(self, bbox, inside, color):
+        color = parse_color(color)
+        x1, y1, x2, y2 = bbox
+        offsets = [(i + 0.5) / SUPERSAMPLE for i in range(SUPERSAMPLE)]
+        samples = SUPERSAMPLE * SUPERSAMPLE
+        for y in range(max(0, math.floor(y1)), min(self.height, math.ceil(y2))):
+            for x in range(max(0, math.floor(x1)), min(self.width, math.ceil(x2))):
+                hits = sum(inside(x + dx, y + dy) for dy in offsets for dx in offsets)
+                if hits:
+                    self.blend(x, y, color, hits / samples)
+
+    def rectangle(self, x1, y1, x2, y2, fill="", outline="#000000", width=1):
+        if fill:
+            self.fill_box(x1, y1, x2, y2, fill)
+        if outline and width:
+            half = width / 2
+            self.fill_box(x1 - half, y1 - half, x2 + half, y1 + half, outline)
+            self.fill_box(x1 - half, y2 - half, x2 + half, y2 + half, outline)
+            self.fill_box(x1 - half, y1 + half, x1 + half, y2 - half, outline)
+            self.fill_box(x2 - half, y1 + half, x2 + half, y2 - half, outline)
+
+    def oval(self, x1, y1, x2, y2, fill="", outline="#000000", width=1):
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        rx, ry = (x2 - x1) / 2, (y2 - y1) / 2
+
+        def within(px, py, grow):
+            return ((px - cx) / (rx + grow)) ** 2 + ((py - cy) / (ry + grow)) ** 2 <= 1
+
+        half = width / 2 if outline else 0
+        bbox = (x1 - half, y1 - half, x2 + half, y2 + half)
+        if fill:
+            self.fill_shape(bbox, lambda px, py: within(px, py, 0), fill)
+        if outline and width:
+            self.fill_shape(bbox, lambda px, py: within(px, py, half) and not within(px, py, -half), outline)
+
+    def line(self, *points, fill="#000000", width=1):
+        half = width / 2
+        for (ax, ay), (bx, by) in zip(zip(points[::2], points[1::2]), zip(points[2::2], points[3::2])):
+            dx, dy = bx - ax, by - ay
+            length = dx * dx + dy * dy or 1e-9
+
+            def inside(px, py, ax=ax, ay=ay, dx=dx, dy=dy, length=length):
+                t = ((px - ax) * dx + (py - ay) * dy) / length
+                if t < 0 or t > 1:
+                    return False
+                return (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2 <= half * half
+
+            bbox = (min(ax, bx) - half, min(ay, by) - half, max(ax, bx) + half, max(ay, by) + half)
+            self.fill_shape(bbox, inside, fill)
+
+    def text(self, x, y, text, fill):
+        left = round(x - (len(text) * 4 - 1) / 2)
+        top = round(y - 2.5)
+        for i, char in enumerate(text):
+            for row, bits in enumerate(FONT[char]):
+                for column, bit in enumerate(bits):
+                    if bit == "1":
+                        self.fill_box(left + i * 4 + column, top + row, left + i * 4 + column + 1, top + row + 1, fill)
+
+    def rgb(self):
+        return bytes(min(255, max(0, round(value))) for pixel in self.pixels for value in pixel)
+
+
+def draw_fan(raster, angle):
+    raster.oval(15, 15, 25, 25, fill="#333333", outline="#333333")
+    for points in fan_frame(angle):
+        raster.line(*points, width=3, fill="#333333")
+
+
+def draw_light(raster, step):
+    bulb_color, glow_color = light_frame(step)
+    raster.oval(5, 5, 25, 25, fill=glow_color, outline="")
+    raster.oval(8, 8, 22, 22, fill=bulb_color, outline="#333333")
+    raster.rectangle(12, 22, 18, 30, fill="#888888", outline="#333333")
+    raster.rectangle(10, 30, 20, 35, fill="#888888", outline="#333333")
+
+
+def tv_sprite_frames():
+    frames = [(channel, frame) for channel in range(3) for frame in range(100)]
+    unique = {tv_sprite_index(*args): args for args in reversed(frames)}
+    return [unique[index] for index in range(len(unique))]
+
+
+def draw_tv(raster, channel, frame):
+    news_x, phase, ball = tv_frame(channel, frame)
+    raster.rectangle(5, 5, 45, 35, fill="#222222", outline="#000000", width=2)
+    if channel == 0:
+        raster.rectangle(8, 8, 42, 15, fill="#ff0000", outline="")
+        raster.text(news_x, 12, "NEWS", "#ffffff")
+        raster.rectangle(8, 16, 42, 32, fill="#dddddd", outline="")
+        for i in range(3):
+            raster.line(10, 20 + i * 4, 40, 20 + i * 4, fill="#555555")
+    elif channel == 1:
+        raster.rectangle(8, 8, 42, 32, fill="#0000ff" if phase else "#008800", outline="")
+        if phase:
+            raster.oval(15, 15, 25, 25, fill="#ffff00", outline="")
+        else:
+            raster.rectangle(25, 15, 35, 25, fill="#ff0000", outline="")
+    else:
+        raster.rectangle(8, 8, 42, 32, fill="#00aa00", outline="")
+        raster.oval(*ball, fill="#ffffff", outline="")
+    raster.rectangle(20, 35, 30, 38, fill="#444444", outline="#000000")
+
+
+SPRITES = {
+    "fan": ((40, 40), draw_fan, [(angle,) for angle in range(0, 360, 10)]),
+    "light": ((40, 40), draw_light, [(step,) for step in range(BRIGHTNESS_STEPS + 1)]),
+    "tv": ((50, 40), draw_tv, tv_sprite_frames()),
+}
+
+
+def code_version():
+    digest = hashlib.sha1()
+    for path in (__file__, frame_geometry.__file__):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def sheet_path(kind, theme="default", directory=SPRITE_DIR, version=None):
+    width, height = SPRITES[kind][0]
+    return os.path.join(directory, f"{kind}-{theme}-{width}x{height}-{version or code_version()}.ppm")
+
+
+def render_frames(kind, theme, start, end):
+    (width, height), draw, frames = SPRITES[kind]
+    rendered = []
+    for args in frames[start:end]:
+        raster = Raster(width, height, THEMES[theme]["background"])
+        draw(raster, *args)
+        rendered.append(raster.rgb())
+    return rendered
+
+
+def write_sheet(path, kind, rendered):
+    (width, height), _draw, _frames = SPRITES[kind]
+    stride = width * 3
+    rows = [frame[y * stride:(y + 1) * stride] for y in range(height) for frame in rendered]
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(f"P6 {width * len(rendered)} {height} 255\n".encode())
+        f.write(b"".join(rows))
+    os.replace(temp_path, path)
+
+
+def prune_sheets(directory=SPRITE_DIR, version=None):
+    current = f"-{version or code_version()}.ppm"
+    removed = []
+    for name in os.listdir(directory):
+        if name.endswith(".ppm") and not name.endswith(current):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                continue
+            removed.append(name)
+    return removed
+
+
+def missing_sheets(theme="default", directory=SPRITE_DIR):
+    version = code_version()
+    prune_sheets(directory, version)
+    paths = {kind: sheet_path(kind, theme, directory, version) for kind in SPRITES}
+    return {kind: path for kind, path in paths.items() if not os.path.exists(path)}, paths
+
+
+class SheetBuild:
+    def __init__(self, theme="default", directory=SPRITE_DIR, jobs=None, chunk=CHUNK_FRAMES):
+        from concurrent.futures import ProcessPoolExecutor
+        import multiprocessing
+        os.makedirs(directory, exist_ok=True)
+        self.theme = theme
+        missing, self.paths = missing_sheets(theme, directory)
+        self.pending = {}
+        if not missing:
+            self.pool = None
+            return
+        self.pool = ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn"))
+        for kind, path in missing.items():
+            count = len(SPRITES[kind][2])
+            self.pending[kind] = (path, [
+                self.pool.submit(render_frames, kind, theme, start, min(start + chunk, count))
+                for start in range(0, count, chunk)
+            ])
+        self.pool.shutdown(wait=False)
+
+    def collect(self, wait=False):
+        finished = []
+        for kind, (path, futures) in list(self.pending.items()):
+            if wait or all(future.done() for future in futures):
+                write_sheet(path, kind, [frame for future in futures for frame in future.result()])
+                del self.pending[kind]
+                finished.append(kind)
+        return finished
+
+    def done(self):
+        return not self.pending
+
+    def cancel(self):
+        for _path, futures in self.pending.values():
+            for future in futures:
+                future.cancel()
+        self.pending.clear()
+
+
+def build_sheets(theme="default", directory=SPRITE_DIR, jobs=None):
+    build = SheetBuild(theme, directory, jobs)
+    build.collect(wait=True)
+    return build.paths
+
+
+def load_frames(photo_image, path, kind):
+    (width, height), _draw, frames = SPRITES[kind]
+    sheet = photo_image(file=path)
+    images = []
+    for i in range(len(frames)):
+        image = photo_image(width=width, height=height)
+        image.tk.call(image, "copy", sheet, "-from", i * width, 0, (i + 1) * width, height)
+        images.append(image)
+    return images
+
+
+def main():
+    import argparse
+    import shutil
+    parser = argparse.ArgumentParser(description="Pre-render animation sprite sheets")
+    parser.add_argument("--dir", default=SPRITE_DIR)
+    parser.add_argument("--theme", default="default", choices=sorted(THEMES))
+    parser.add_argument("--jobs", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="discard the cache and rebuild")
+    args = parser.parse_args()
+
+    if args.force:
+        shutil.rmtree(args.dir, ignore_errors=True)
+    started = time.perf_counter()
+    paths = build_sheets(args.theme, args.dir, args.jobs)
+    elapsed = time.perf_counter() - started
+    for kind, path in paths.items():
+        print(f"{kind:<6} {len(SPRITES[kind][2]):>4} frames  {os.path.getsize(path):>8} bytes  {path}")
+    print(f"ready in {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
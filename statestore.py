@@ -0,0 +1,194 @@
+import mmap
+import os
+import struct
+import time
+
+STORE_FILE = "appliance_states.bin"
+MAGIC = b"HSTA"
+VERSION = 1
+HEADER = struct.Struct("<4sHxxIIQd")
+SEQUENCE = struct.Struct("<Q")
+SEQUENCE_OFFSET = 16
+UPDATED = struct.Struct("<d")
+UPDATED_OFFSET = 24
+
+
+def encode_index(device_ids):
+    index = "\n".join(device_ids).encode()
+    return index + b"\0" * (-len(index) % 8)
+
+
+def parse_header(mm):
+    magic, version, count, index_size, _sequence, _updated = HEADER.unpack_from(mm)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not an appliance state store")
+    index = bytes(mm[HEADER.size:HEADER.size + index_size]).rstrip(b"\0").decode()
+    device_ids = index.split("\n") if index else []
+    if len(device_ids) != count:
+        raise ValueError("corrupt device index")
+    return device_ids, HEADER.size + index_size
+
+
+class StateStore:
+    def __init__(self, path, device_ids, states=None):
+        self.path = path
+        self.device_ids = list(device_ids)
+        self.index = {device_id: i for i, device_id in enumerate(self.device_ids)}
+        self.depth = 0
+        try:
+            self.open()
+        except (FileNotFoundError, ValueError):
+            self.create(states or {})
+
+    def open(self):
+        self.file = open(self.path, "r+b")
+        try:
+            self.mm = mmap.mmap(self.file.fileno(), 0)
+            device_ids, self.offset = parse_header(self.mm)
+        except (ValueError, struct.error):
+            self.close()
+            raise ValueError("incompatible state store")
+        if device_ids != self.device_ids:
+            self.close()
+            raise ValueError("device list changed")
+        self.sequence = SEQUENCE.unpack_from(self.mm, SEQUENCE_OFFSET)[0] & ~1
+
+    def create(self, states):
+        index = encode_index(self.device_ids)
+        values = bytes(bool(states.get(device_id, False)) for device_id in self.device_ids)
+        header = HEADER.pack(MAGIC, VERSION, len(self.device_ids), len(index), 0, time.time())
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(header + index + values + b"\0" * (-len(values) % 8))
+        os.replace(temp_path, self.path)
+        self.open()
+
+    def begin(self):
+        if self.depth == 0:
+            self.sequence += 1
+            SEQUENCE.pack_into(self.mm, SEQUENCE_OFFSET, self.sequence)
+        self.depth += 1
+
+    def end(self):
+        self.depth -= 1
+        if self.depth == 0:
+            UPDATED.pack_into(self.mm, UPDATED_OFFSET, time.time())
+            self.sequence += 1
+            SEQUENCE.pack_into(self.mm, SEQUENCE_OFFSET, self.sequence)
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.end()
+
+    def set(self, device_id, state):
+        self.begin()
+        self.mm[self.offset + self.index[device_id]] = 1 if state else 0
+        self.end()
+
+    def write_all(self, states):
+        updates = [(self.offset + self.index[device_id], 1 if state else 0) for device_id, state in states.items()]
+        mm = self.mm
+        with self:
+            for position, value in updates:
+                mm[position] = value
+
+    def close(self):
+        if getattr(self, "mm", None) is not None:
+            self.mm.close()
+            self.mm = None
+        if getattr(self, "file", None) is not None:
+            self.file.close()
+            self.file = None
+
+
+class StateReader:
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.device_ids, self.offset = parse_header(self.mm)
+        self.inode = os.fstat(self.file.fileno()).st_ino
+
+    def sequence(self):
+        return SEQUENCE.unpack_from(self.mm, SEQUENCE_OFFSET)[0]
+
+    def snapshot(self, timeout=1.0):
+        end = self.offset + len(self.device_ids)
+        deadline = None
+        while True:
+            before = SEQUENCE.unpack_from(self.mm, SEQUENCE_OFFSET)[0]
+            if not before & 1:
+                values = self.mm[self.offset:end]
+                updated = UPDATED.unpack_from(self.mm, UPDATED_OFFSET)[0]
+                if SEQUENCE.unpack_from(self.mm, SEQUENCE_OFFSET)[0] == before:
+                    return before, updated, values
+            if deadline is None:
+                deadline = time.monotonic() + timeout
+            elif time.monotonic() > deadline:
+                raise TimeoutError("state store writer did not finish an update")
+            time.sleep(0)
+
+    def states(self):
+        _sequence, _updated, values = self.snapshot()
+        return {device_id: bool(value) for device_id, value in zip(self.device_ids, values)}
+
+    def replaced(self):
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except FileNotFoundError:
+            return True
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Read the shared appliance state store")
+    parser.add_argument("--file", default=STORE_FILE)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("show")
+    watch = commands.add_parser("watch")
+    watch.add_argument("--interval", type=float, default=0.01, help="poll interval in seconds")
+    export = commands.add_parser("export")
+    export.add_argument("output", help="JSON file to write")
+    args = parser.parse_args()
+
+    reader = StateReader(args.file)
+    try:
+        if args.command == "show":
+            for device_id, state in reader.states().items():
+                print(f"{device_id} {'ON' if state else 'OFF'}")
+        elif args.command == "export":
+            with open(args.output, "w") as f:
+                json.dump(reader.states(), f, indent=2)
+        elif args.command == "watch":
+            seen = None
+            last = {}
+            while True:
+                if reader.replaced():
+                    reader.close()
+                    reader = StateReader(args.file)
+                    seen = None
+                if reader.sequence() != seen:
+                    seen, _updated, values = reader.snapshot()
+                    states = {device_id: bool(value) for device_id, value in zip(reader.device_ids, values)}
+                    for device_id, state in states.items():
+                        if last.get(device_id) != state:
+                            print(f"{time.strftime('%H:%M:%S')} {device_id} {'ON' if state else 'OFF'}", flush=True)
+                    last = states
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()